@@ -2,8 +2,36 @@ from .pypwc import Canvas, Transformations, fields
 from .pypwc.Canvas import *
 from .pypwc.Transformations import *
 from .pypwc.fields import *
-from . import functional
-from . import utils
+from .pypwc.graph import ConnectorGraph
+from .pypwc.lineage import Lineage, PortLineage
+from .pypwc.names import NameRegistry, name_scope, current_registry
+
+import importlib
+
+# Modules, and names from modules, that are only imported when they are
+# first used (see PEP 562), so that importing the package does not import
+# the database layer, asyncio or multiprocessing
+_lazy_modules = {'functional', 'from_xml', 'utils'}
+_lazy_names = {
+    'write_many': '.pypwc.batch',
+    'WriteResult': '.pypwc.batch',
+    'MetadataProvider': '.pypwc.metadata',
+    'NetezzaBackend': '.pypwc.metadata',
+    'SQLiteBackend': '.pypwc.metadata',
+}
+
+def __getattr__(name):
+    if name in _lazy_modules:
+        value = importlib.import_module('.' + name, __name__)
+    elif name in _lazy_names:
+        value = getattr(importlib.import_module(_lazy_names[name], __name__), name)
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | _lazy_modules | set(_lazy_names))
 
 __all__ = [
     # From Canvas:
@@ -11,9 +39,20 @@ __all__ = [
     # From Transformations:
     'Expression', 'SourceQualifier', 'UpdateStrategy',
     'Filter', 'Aggregator', 'Lookup', 'Sequence',
-    'Joiner', 'Normalizer', 'Rank', 'Router',
+    'Joiner', 'Normalizer', 'Rank', 'Router', 'RouterGroup',
     'Sorter', 'TransactionControl',
-    'Target',
+    'Source', 'Target',
     # from fields:
-    'ifield', 'ofield', 'iofield', 'vfield', 'mvar',
+    'ifield', 'ofield', 'iofield', 'vfield', 'mvar', 'Field',
+    'fields_from_columns',
+    # from batch:
+    'write_many', 'WriteResult',
+    # from graph:
+    'ConnectorGraph',
+    # from lineage:
+    'Lineage', 'PortLineage',
+    # from names:
+    'NameRegistry', 'name_scope', 'current_registry',
+    # from metadata:
+    'MetadataProvider', 'NetezzaBackend', 'SQLiteBackend',
     ]
@@ -0,0 +1,37 @@
+'''
+Microbenchmark of field creation throughput.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_fields.py
+'''
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pypwc.fields import ifield, iofield, mvar, targetfield
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+cases = {
+    'ifield (static precision)': lambda: ifield('FIELD', 'bigint'),
+    'iofield (default precision)': lambda: iofield('FIELD', 'nstring', description='A  field\n description'),
+    'iofield (given precision)': lambda: iofield('FIELD', 'decimal', precision='18', scale='4'),
+    'targetfield': lambda: targetfield('FIELD', 'nvarchar', precision='50', scale='0'),
+    'mvar': lambda: mvar('$$VAR', 'integer', aggfunction='MAX'),
+}
+
+def run(number=100000, repeat=5):
+    '''Returns {case: fields created per second}, using the best of repeat runs.'''
+    results = {}
+    for name, case in cases.items():
+        best = min(timeit.repeat(case, number=number, repeat=repeat))
+        results[name] = number/best
+    return results
+
+if __name__ == '__main__':
+    for name, per_second in run().items():
+        print('{:<30}{:>12,.0f} fields/s'.format(name, per_second))
@@ -0,0 +1,63 @@
+'''
+Benchmark of the cold start time of importing the package, in fresh
+interpreters, with the lazily imported modules left alone, and with all
+of them imported, as every import of the package used to do.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_import.py
+'''
+import os
+import statistics
+import subprocess
+import sys
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+package = os.path.basename(root)
+
+# The modules that should only be imported when used
+lazy_modules = ['utils', 'functional', 'from_xml', 'pypwc.batch',
+                'pypwc.metadata', 'asyncio', 'multiprocessing', 'sqlite3']
+
+cases = {
+    'import (lazy)': '',
+    'import and use everything': '; '.join(
+        '{}.{}'.format(package, name) for name in
+        ['utils', 'functional', 'from_xml', 'write_many', 'MetadataProvider']),
+}
+
+_script = '''
+import sys, time
+start = time.perf_counter()
+import {package}
+{use}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {lazy_modules!r}
+          if name in sys.modules or '{package}.' + name in sys.modules]
+print(elapsed, len(sys.modules), ','.join(loaded))
+'''
+
+def run(repeat=20):
+    '''Returns {case: (median seconds, modules loaded, lazy modules loaded)},
+    each run in a new interpreter.'''
+    results = {}
+    for name, use in cases.items():
+        script = _script.format(package=package, use=use, lazy_modules=lazy_modules)
+        times = []
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, '-c', script], cwd=os.path.dirname(root),
+                stdout=subprocess.PIPE, check=True, universal_newlines=True).stdout
+            elapsed, modules, loaded = output.split(' ')
+            times.append(float(elapsed))
+        results[name] = (statistics.median(times), int(modules),
+                         [module for module in loaded.strip().split(',') if module])
+    return results
+
+if __name__ == '__main__':
+    for name, (seconds, modules, loaded) in run().items():
+        print('{:<28}{:>8.1f} ms {:>6} modules   lazy modules loaded: {}'.format(
+            name, seconds*1000, modules, ', '.join(loaded) or 'none'))
@@ -0,0 +1,235 @@
+'''
+Benchmark of building and serializing synthetic mappings of increasing
+size, timing each stage separately so the scaling of every code path
+can be followed across sizes and compared to a stored baseline.
+
+A mapping of size n has n expressions in a chain, each with the given
+number of ports, connected by name, a router with the given number of
+groups, each connected on to an expression of its own, and the given
+number of mapplets, each a chain of expressions of its own.
+
+Run from the root of the repository:
+
+    python benchmarks/bench_mapping.py
+    python benchmarks/bench_mapping.py --sizes 10 100 --json results.json
+    python benchmarks/bench_mapping.py --save-baseline benchmarks/baseline.json
+    python benchmarks/bench_mapping.py --baseline benchmarks/baseline.json
+
+With --baseline, every stage that is both more than --tolerance and
+more than --min-delta milliseconds slower than in the baseline is
+reported, and the exit status is 1. The absolute floor keeps stages
+that take well under a millisecond from failing on noise.
+'''
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pypwc.Canvas import Mapping, Mapplet, MappletIO
+from pypwc.Transformations import Expression, Router
+from pypwc.fields import fields_from_columns
+from pypwc.names import name_scope
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+stages = ['add_fields', 'connect_by_name', 'connect', 'mapplet', 'as_xml', 'write']
+
+# Ports cycle through these datatypes: (datatype, precision, scale)
+_datatypes = [('bigint', None, None), ('nstring', '50', None), ('decimal', '18', '4')]
+
+
+def _fields(ports, porttype='INPUT/OUTPUT', prefix='F'):
+    names = ['{}{}'.format(prefix, i) for i in range(ports)]
+    datatypes, precisions, scales = zip(*(_datatypes[i % len(_datatypes)]
+                                          for i in range(ports)))
+    return fields_from_columns(names, datatypes, precisions=precisions,
+                               scales=scales, porttype=porttype)
+
+
+class Timer(object):
+    '''Accumulates the seconds spent in each stage.'''
+    def __init__(self):
+        self.seconds = dict.fromkeys(stages, 0.0)
+
+    @contextlib.contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+        yield
+        self.seconds[stage] += time.perf_counter() - start
+
+
+def build(size, ports=20, groups=4, mapplets=2, mapplet_size=5, timer=None):
+    '''Returns a Mapping of size expressions, see the module docstring,
+    with the time spent in each stage added to timer.'''
+    timer = timer or Timer()
+    mapping = Mapping('m_bench_{}'.format(size))
+    mapping.creation_date = '01/01/2020 00:00:00'
+
+    with timer('add_fields'):
+        expressions = []
+        for i in range(size):
+            expression = Expression(name='chain_{}'.format(i))
+            expression.add_fields(_fields(ports))
+            expressions.append(expression)
+        router = Router(name='router')
+        router.add_fields(_fields(ports, porttype='INPUT'))
+        for g in range(groups):
+            router.groups['G{}'.format(g)] = ('', 'F0 > {}'.format(g), str(g + 1), 'OUTPUT')
+        ends = []
+        for g in range(groups):
+            end = Expression(name='end_{}'.format(g))
+            end.add_fields(_fields(ports, porttype='INPUT'))
+            ends.append(end)
+
+    for component in expressions + [router] + ends:
+        mapping.add_component(component)
+
+    with timer('connect_by_name'):
+        for a, b in zip(expressions, expressions[1:]):
+            mapping.connect_by_name(a, b)
+
+    with timer('connect'):
+        names = ['F{}'.format(i) for i in range(ports)]
+        if expressions:
+            mapping.connect(expressions[-1], router, {name: name for name in names})
+        for g, end in enumerate(ends):
+            mapping.connect(router.group('G{}'.format(g)), end,
+                            {'{}{}'.format(name, g + 1): name for name in names})
+
+    with timer('mapplet'):
+        for m in range(mapplets):
+            chain = []
+            for i in range(mapplet_size):
+                expression = Expression(name='mplt_{}_{}'.format(m, i))
+                expression.add_fields(_fields(ports))
+                chain.append(expression)
+            mapplet = Mapplet(name='mplt_{}'.format(m), component_list=chain)
+            mapplet.input['input'] = MappletIO(name='INPUT', io_type='input',
+                                               parent_mapplet=mapplet)
+            mapplet.input['input'].add_fields(_fields(ports, porttype='OUTPUT'))
+            mapplet.output['output'] = MappletIO(name='OUTPUT', io_type='output',
+                                                 parent_mapplet=mapplet)
+            mapplet.output['output'].add_fields(_fields(ports, porttype='INPUT'))
+            mapplet.connect_by_index(mapplet.input['input'], chain[0])
+            for a, b in zip(chain, chain[1:]):
+                mapplet.connect_by_name(a, b)
+            mapplet.connect_by_index(chain[-1], mapplet.output['output'])
+            mapping.add_component(mapplet)
+            if expressions:
+                mapping.connect_by_name(expressions[0], mapplet.input['input'])
+    return mapping
+
+
+def measure(size, repeat=3, **parameters):
+    '''Returns {stage: seconds} for a mapping of size, using the best of
+    repeat runs for each stage.'''
+    best = dict.fromkeys(stages, float('inf'))
+    directory = tempfile.mkdtemp(prefix='pypwc-bench-')
+    try:
+        for _ in range(repeat):
+            timer = Timer()
+            with name_scope():
+                mapping = build(size, timer=timer, **parameters)
+                with timer('as_xml'):
+                    mapping.as_xml()
+                # Silences the 'Wrote to ...' of write()
+                with timer('write'), contextlib.redirect_stdout(io.StringIO()):
+                    mapping.write(os.path.join(directory, 'mapping.xml'), force=True)
+            for stage, seconds in timer.seconds.items():
+                best[stage] = min(best[stage], seconds)
+    finally:
+        shutil.rmtree(directory)
+    return best
+
+
+def run(sizes=(10, 100, 1000), repeat=3, **parameters):
+    '''Returns the results of measure() for each of sizes, together with
+    the parameters and the environment they were measured in.'''
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': dict(parameters, repeat=repeat),
+        'results': {str(size): measure(size, repeat=repeat, **parameters)
+                    for size in sizes},
+    }
+
+
+def regressions(results, baseline, tolerance=0.25, min_delta=0.002):
+    '''Returns [(size, stage, seconds, baseline seconds)] of every stage
+    that is more than tolerance, and more than min_delta seconds, slower
+    than in baseline. Sizes and stages missing from either are skipped.'''
+    if baseline['parameters'] != results['parameters']:
+        print('Warning: the baseline was measured with the parameters {}'.format(
+            baseline['parameters']), file=sys.stderr)
+    slower = []
+    for size, seconds in results['results'].items():
+        for stage, value in seconds.items():
+            reference = baseline['results'].get(size, {}).get(stage)
+            if (reference and value > reference*(1 + tolerance)
+                    and value - reference > min_delta):
+                slower.append((size, stage, value, reference))
+    return slower
+
+
+def _print(results, baseline=None):
+    print('{:>8}'.format('size') + ''.join('{:>17}'.format(stage) for stage in stages))
+    for size, seconds in results['results'].items():
+        line = '{:>8}'.format(size)
+        for stage in stages:
+            cell = '{:.1f} ms'.format(seconds[stage]*1000)
+            reference = baseline and baseline['results'].get(size, {}).get(stage)
+            if reference:
+                cell += ' {:+.0%}'.format(seconds[stage]/reference - 1)
+            line += '{:>17}'.format(cell)
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000],
+                        help='the numbers of expressions in the chain')
+    parser.add_argument('--ports', type=int, default=20)
+    parser.add_argument('--groups', type=int, default=4)
+    parser.add_argument('--mapplets', type=int, default=2)
+    parser.add_argument('--mapplet-size', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare to the results in this file')
+    parser.add_argument('--save-baseline', help='write the results to this file as a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='the fraction a stage may be slower than the baseline')
+    parser.add_argument('--min-delta', type=float, default=2.0,
+                        help='the milliseconds a stage may be slower than the baseline')
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, repeat=args.repeat, ports=args.ports, groups=args.groups,
+                  mapplets=args.mapplets, mapplet_size=args.mapplet_size)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    _print(results, baseline)
+
+    for path in filter(None, [args.json, args.save_baseline]):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if baseline is not None:
+        slower = regressions(results, baseline, args.tolerance, args.min_delta/1000)
+        for size, stage, seconds, reference in slower:
+            print('Regression: {} at size {} took {:.1f} ms, {:.1f} ms in the baseline'.format(
+                stage, size, seconds*1000, reference*1000))
+        return 1 if slower else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
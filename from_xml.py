@@ -1,31 +1,750 @@
-from pypwc.Canvas import Mapping, Mapplet, MappletIO
-from pypwc.Transformations import *
+'''
+A module for importing POWERMART XML exports into pypwc objects.
 
+The file is streamed with ET.iterparse, and every element is freed as
+soon as it has been turned into a pypwc object, so memory use does not
+grow with the size of the export, but only with the objects built.
+'''
+from .pypwc.Canvas import Mapping, Mapplet, MappletIO
+from .pypwc.Transformations import *
+from .pypwc.Transformations import Transformation
+from .pypwc.fields import Field
+from .pypwc import writer
+
+from collections import namedtuple
+from collections.abc import Mapping as _Mapping
+from copy import copy, deepcopy
+import hashlib
+import json
+import mmap
+import os
+import re
+from sys import intern
 import xml.etree.cElementTree as ET
-import xml.dom.minidom as minidom
 
-from collections import Counter
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+Folder = namedtuple('Folder', [
+    'attributes', 'sources', 'targets', 'transformations',
+    'mapplets', 'mappings'
+])
+
+
+class _Transformation(Transformation):
+    '''A transformation of a type that has no class of its own,
+    e.g. a Stored Procedure.'''
+    def _set_name(self, value):
+        self._name = value
+
+# TYPE attribute: class
+_transformation_classes = {
+    'Expression': Expression,
+    'Source Qualifier': SourceQualifier,
+    'Update Strategy': UpdateStrategy,
+    'Filter': Filter,
+    'Aggregator': Aggregator,
+    'Lookup': Lookup,
+    'Sequence': Sequence,
+    'Joiner': Joiner,
+    'Normalizer': Normalizer,
+    'Rank': Rank,
+    'Router': Router,
+    'Sorter': Sorter,
+    'Transaction Control': TransactionControl,
+}
+
+# The TYPE of an INSTANCE: the part of the folder holding its definition
+_instance_types = {
+    'SOURCE': 'sources',
+    'TARGET': 'targets',
+    'TRANSFORMATION': 'transformations',
+    'MAPPLET': 'mapplets',
+}
+
+
+def _field(element):
+    '''Returns a Field, or a (tag, attrib_dict, [nested_fields])-tuple
+    if element has subelements.'''
+    att = element.attrib
+    if len(element):
+        return (element.tag, dict(att), [_field(sub) for sub in element])
+    return Field.from_values(element.tag, att.keys(), att.values())
+
+def _set_fields(component, element, table_attributes=True):
+    '''Replaces the fields of component with the subelements of element.
+    TABLEATTRIBUTEs become table_attributes, if table_attributes is True.'''
+    fields = []
+    attributes = {}
+    for sub in element:
+        if table_attributes and sub.tag == 'TABLEATTRIBUTE':
+            attributes[sub.get('NAME')] = sub.get('VALUE', '')
+        else:
+            fields.append(_field(sub))
+    component._fields = fields
+    component._reindex_fields()
+    if table_attributes:
+        component.table_attributes = attributes
+
+def _set_common_attributes(component, att):
+    # The classes add prefixes to names that lack them, but names from an
+    # export must be kept as they are, since CONNECTORs refer to them
+    component._name = att.get('NAME', '')
+    component._description = att.get('DESCRIPTION', '')
+    component._object_version = att.get('OBJECTVERSION', '')
+    component._version_number = att.get('VERSIONNUMBER', '')
+
+def source_from_element(element):
+    '''Returns the Source defined by a SOURCE element.'''
+    att = element.attrib
+    source = Source(name=att.get('NAME', 'SRC'))
+    _set_common_attributes(source, att)
+    source.business_name = att.get('BUSINESSNAME', '')
+    source.database_type = att.get('DATABASETYPE', '')
+    source.dbd_name = att.get('DBDNAME', '')
+    source.owner_name = att.get('OWNERNAME', '')
+    _set_fields(source, element, table_attributes=False)
+    return source
+
+def target_from_element(element):
+    '''Returns the Target defined by a TARGET element.'''
+    att = element.attrib
+    target = Target(name=att.get('NAME', 'TRG'))
+    _set_common_attributes(target, att)
+    target.business_name = att.get('BUSINESSNAME', '')
+    target.constraint = att.get('CONSTRAINT', '')
+    target.database_type = att.get('DATABASETYPE', '')
+    target.table_options = att.get('TABLEOPTIONS', '')
+    _set_fields(target, element, table_attributes=False)
+    return target
+
+def transformation_from_element(element):
+    '''Returns the Transformation defined by a TRANSFORMATION element.
+    Types without a class of their own are kept as they are.'''
+    att = element.attrib
+    transformation_type = att.get('TYPE', '')
+    cls = _transformation_classes.get(transformation_type)
+    if cls is None:
+        transformation = _Transformation(type=transformation_type,
+                                         name=att.get('NAME', ''))
+    else:
+        transformation = cls(name=att.get('NAME', ''))
+    _set_common_attributes(transformation, att)
+    transformation.is_reusable = att.get('REUSABLE', 'NO')
+    _set_fields(transformation, element)
+    return transformation
+
+def _mapplet_io_from_element(element, mapplet):
+    att = element.attrib
+    io_type = 'input' if att['TYPE'] == 'Input Transformation' else 'output'
+    mapplet_io = MappletIO(att['NAME'], io_type, mapplet)
+    mapplet_io.attributes.update(att)
+    _set_fields(mapplet_io, element)
+    getattr(mapplet, io_type)[mapplet_io.name] = mapplet_io
+    return mapplet_io
+
+def _instance(definition, name):
+    '''Returns a copy of definition, the instance called name, with fields,
+    table attributes, parents and children of its own. The definitions
+    are shared by all the composites of the folder, and must not change.'''
+    instance = copy(definition)
+    if isinstance(instance, Mapplet):
+        instance.name = name
+        instance.attributes = dict(definition.attributes, NAME=name)
+        instance._component_list_cache = None
+        instance._io_cache = None
+    else:
+        instance._name = name
+    instance._fields = [field.replace() if isinstance(field, Field) else deepcopy(field)
+                        for field in definition._fields]
+    instance._reindex_fields()
+    instance.table_attributes = dict(definition.table_attributes)
+    instance.parents = []
+    instance.children = []
+    instance._parent_set = set()
+    instance._child_set = set()
+    return instance
+
+
+class _CompositeBuilder(object):
+    '''
+    Builds a Mapping or Mapplet from the subelements of a MAPPING or
+    MAPPLET element, one subelement at a time.
+
+    Instances are resolved against the definitions read so far from
+    the folder. Instances of definitions that are not in the file,
+    e.g. shortcuts to other folders, are left out.
+    '''
+    def __init__(self, element, folder):
+        att = element.attrib
+        if element.tag == 'MAPPLET':
+            self.composite = Mapplet(att['NAME'])
+        else:
+            self.composite = Mapping(att['NAME'])
+        self.composite.attributes['DESCRIPTION'] = att.get('DESCRIPTION', '')
+        self.folder = folder
+        # The transformations defined inside the composite, by name, and
+        # those of them that are added once their INSTANCE is read, so
+        # that the order of the instances is kept
+        self.local = {}
+        self.pending = {}
+        # The names of the instances that were left out, and whose
+        # connectors are left out as well
+        self.skipped = set()
+
+    def consume(self, element):
+        tag = element.tag
+        composite = self.composite
+        if tag == 'TRANSFORMATION':
+            transformation_type = element.get('TYPE')
+            if transformation_type in ('Input Transformation',
+                                       'Output Transformation'):
+                mapplet_io = _mapplet_io_from_element(element, composite)
+                self.local[mapplet_io.name] = mapplet_io
+            elif transformation_type != 'Mapplet':
+                # Transformations of type Mapplet describe instances of
+                # mapplets, and are created by the Mapplet itself
+                transformation = transformation_from_element(element)
+                self.local[transformation.name] = transformation
+                self.pending[transformation.name] = transformation
+        elif tag == 'INSTANCE':
+            self._add_instance(element)
+        elif tag == 'CONNECTOR':
+            composite.add_connection(dict(element.attrib))
+        elif tag == 'TARGETLOADORDER':
+            target = composite.get_component_by_name(element.get('TARGETINSTANCE'))
+            if target is not None:
+                target.load_order = element.get('ORDER')
+        elif tag == 'MAPPINGVARIABLE':
+            composite.mapping_variables.append(_field(element))
+
+    def _add_instance(self, element):
+        att = element.attrib
+        name = att['NAME']
+        if name in self.local:
+            if name in self.pending:
+                self.composite.add_component(self.pending.pop(name))
+            return
+        definitions = getattr(self.folder, _instance_types.get(att.get('TYPE'), ''), {})
+        component = definitions.get(att.get('TRANSFORMATION_NAME', name))
+        if component is None:
+            self.skipped.add(name)
+            return
+        component = _instance(component, name)
+        if component.component_type == 'TARGET':
+            component.table_attributes = {
+                sub.get('NAME'): sub.get('VALUE', '')
+                for sub in element if sub.tag == 'TABLEATTRIBUTE'
+            }
+        self.composite.add_component(component)
+
+    def finish(self):
+        '''Declares parents and children from the connectors, and
+        returns the composite.'''
+        composite = self.composite
+        composite.add_components(self.pending.values())
+        self.pending = {}
+        for connection in composite.connection_list:
+            from_component = composite.get_component_by_name(connection['FROMINSTANCE'])
+            to_component = composite.get_component_by_name(connection['TOINSTANCE'])
+            if from_component is None or to_component is None:
+                names = {connection['FROMINSTANCE'], connection['TOINSTANCE']}
+                if names & self.skipped:
+                    continue
+                raise ValueError('{} connects instances that are not in {}'.format(
+                    connection, composite.name))
+            from_component.add_child(to_component)
+        return composite
 
-def component_from_xml(elementTree, xpath):
-    pass
+
+def composite_from_element(element, folder):
+    '''Returns the Mapping or Mapplet defined by a MAPPING or MAPPLET
+    element, with instances resolved against the definitions in folder.'''
+    builder = _CompositeBuilder(element, folder)
+    for sub in element:
+        builder.consume(sub)
+    return builder.finish()
+
+def _iterparse(path):
+    '''Yields (folder, component)-tuples, where folder is the Folder
+    holding the definitions read so far.'''
+    stack = []
+    folder = builder = None
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(element)
+            if len(stack) == 3 and element.tag == 'FOLDER':
+                folder = Folder(dict(element.attrib), {}, {}, {}, {}, {})
+            elif (len(stack) == 4 and folder is not None
+                  and element.tag in ('MAPPING', 'MAPPLET')):
+                builder = _CompositeBuilder(element, folder)
+            continue
+
+        stack.pop()
+        depth = len(stack)
+        if depth == 4 and builder is not None:
+            builder.consume(element)
+        elif depth == 3 and folder is not None:
+            tag = element.tag
+            component = None
+            if tag == 'SOURCE':
+                component = source_from_element(element)
+                folder.sources[component.name] = component
+            elif tag == 'TARGET':
+                component = target_from_element(element)
+                folder.targets[component.name] = component
+            elif tag == 'TRANSFORMATION':
+                component = transformation_from_element(element)
+                folder.transformations[component.name] = component
+            elif tag == 'MAPPLET':
+                component = builder.finish()
+                folder.mapplets[component.name] = component
+                builder = None
+            elif tag == 'MAPPING':
+                # Mappings are not kept in the folder, since nothing
+                # else refers to them
+                component = builder.finish()
+                builder = None
+            if component is not None:
+                yield folder, component
+        elif depth > 2:
+            # Consumed together with its parent
+            continue
+
+        # Free the element, and detach it from its parent, so that
+        # neither keep growing while the file is read
+        element.clear()
+        if stack:
+            stack[-1].remove(element)
+
+def iter_from_xml(path):
+    '''
+    Streams the POWERMART XML file at path, and yields a
+    (folder_name, component)-tuple for every SOURCE, TARGET, reusable
+    TRANSFORMATION, MAPPLET and MAPPING, as soon as it has been read.
+
+    Every element is freed once it has been consumed, and mappings are
+    not kept after they have been yielded. Other elements in the
+    folders, e.g. workflows and sessions, are skipped.
+    '''
+    for folder, component in _iterparse(path):
+        yield folder.attributes.get('NAME'), component
 
 def from_xml(path):
     '''
     Imports xml file into a pypwc datastructure reflecting the
     PowerCenter construction.
+
+    Returns a dict of {folder name: Folder}, where every Folder holds
+    the folder attributes, and dicts of {name: component} for the
+    sources, targets, reusable transformations, mapplets and mappings.
+    '''
+    folders = {}
+    for folder, component in _iterparse(path):
+        folders[folder.attributes.get('NAME')] = folder
+        if isinstance(component, Mapping):
+            folder.mappings[component.name] = component
+    return folders
+
+
+
+# Everything below reads exports lazily. The file is memory-mapped, and
+# only the byte offsets of the elements in the folders are read up front.
+
+# The elements of a folder that can be looked up by name, and the part of
+# the Folder they go into. Other elements are skipped over.
+_lazy_parts = {
+    b'SOURCE': 'sources',
+    b'TARGET': 'targets',
+    b'TRANSFORMATION': 'transformations',
+    b'MAPPLET': 'mapplets',
+    b'MAPPING': 'mappings',
+}
+_skipped_tags = (b'SHORTCUT', b'CONFIG', b'TASK', b'SESSION', b'WORKLET',
+                 b'WORKFLOW', b'SCHEDULER')
+_start_tag = re.compile(
+    rb'<(FOLDER|' + b'|'.join(list(_lazy_parts) + list(_skipped_tags)) +
+    rb')((?:\s+[^\s=>]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*)\s*(/?)>'
+)
+_attribute = re.compile(rb'([^\s=]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_encoding = re.compile(rb'<\?xml[^>]*encoding\s*=\s*["\']([^"\']+)["\']')
+
+# The number of bytes to index before the pages read are released again
+_release_every = 16 * 1024 * 1024
+
+
+class _LazyComponents(_Mapping):
+    '''
+    A read-only dict of {name: component}, where every component is
+    built from its slice of the export the first time it is accessed.
+    '''
+    def __init__(self, export, build):
+        self._export = export
+        self._build = build
+        self._offsets = {}
+        self._components = {}
+
+    def __getitem__(self, name):
+        component = self._components.get(name)
+        if component is None:
+            start, end = self._offsets[name]
+            component = self._build(self._export._element(start, end))
+            self._components[name] = component
+        return component
+
+    def __contains__(self, name):
+        return name in self._offsets
+
+    def __iter__(self):
+        return iter(self._offsets)
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __repr__(self):
+        return '<{} of {} components, {} built>'.format(
+            type(self).__name__, len(self), len(self._components))
+
+    @property
+    def built(self):
+        '''The names of the components built so far.'''
+        return list(self._components)
+
+
+class LazyExport(object):
+    '''
+    Opens the POWERMART XML file at path for reading on demand.
+
+    The file is memory-mapped, and only the byte offsets of the SOURCE,
+    TARGET, TRANSFORMATION, MAPPLET and MAPPING elements in each folder
+    are read when it is opened. Components are built the first time they
+    are accessed, so looking at a few mappings in a large export does not
+    cost more than reading those mappings.
+
+    >>> with LazyExport('export.xml') as export:
+    ...     mapping = export['MDW_KRE'].mappings['m_test']
+
+    Folders are Folders, as returned by from_xml(), except that the dicts
+    of components are read-only.
+
+    If cache is True, and index_xml() has written an index of the export
+    that is still valid, the offsets are read from the index instead.
+    '''
+    def __init__(self, path, cache=True):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._file.close()
+            raise
+        match = _encoding.match(self._mmap, 0, 1024)
+        self.encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        self.folders = {}
+        index = _read_index(path) if cache else None
+        if index is None:
+            self._index()
+        else:
+            folders, _ = index
+            for attributes, offsets in folders.values():
+                folder = self._new_folder(attributes)
+                for part, part_offsets in offsets.items():
+                    getattr(folder, part)._offsets.update(part_offsets)
+                self.folders[attributes.get('NAME')] = folder
+
+    def _new_folder(self, attributes):
+        def build_composite(element):
+            return composite_from_element(element, folder)
+
+        folder = Folder(attributes,
+                        _LazyComponents(self, source_from_element),
+                        _LazyComponents(self, target_from_element),
+                        _LazyComponents(self, transformation_from_element),
+                        _LazyComponents(self, build_composite),
+                        _LazyComponents(self, build_composite))
+        return folder
+
+    def _index(self):
+        data = self._mmap
+        if hasattr(data, 'madvise'):
+            data.madvise(mmap.MADV_SEQUENTIAL)
+        folder = None
+        released = 0
+        position = 0
+        while True:
+            match = _start_tag.search(data, position)
+            if match is None:
+                break
+            tag, attributes, empty = match.groups()
+            position = match.end()
+            if tag == b'FOLDER':
+                # The content of the folder is indexed as well
+                folder = self._new_folder(self._attributes(attributes))
+                self.folders[folder.attributes.get('NAME')] = folder
+                continue
+
+            start = match.start()
+            if not empty:
+                end_tag = b'</' + tag + b'>'
+                end = data.find(end_tag, position)
+                if end == -1:
+                    raise ValueError('{} at byte {} is never closed'.format(tag.decode(), start))
+                position = end + len(end_tag)
+            if tag in _lazy_parts and folder is not None:
+                name = self._attributes(attributes).get('NAME')
+                getattr(folder, _lazy_parts[tag])._offsets.setdefault(name, (start, position))
+
+            # The pages read are released from this process, so that the
+            # resident memory does not grow with the size of the export
+            if hasattr(data, 'madvise') and position - released > _release_every:
+                release_to = position - position % mmap.PAGESIZE
+                data.madvise(mmap.MADV_DONTNEED, released, release_to - released)
+                released = release_to
+        if hasattr(data, 'madvise'):
+            data.madvise(mmap.MADV_DONTNEED)
+
+    def _attributes(self, data):
+        return {match.group(1).decode(self.encoding):
+                self._unescape(match.group(2) if match.group(3) is None else match.group(3))
+                for match in _attribute.finditer(data)}
+
+    def _unescape(self, value):
+        # Let the parser resolve entities and character references
+        if b'&' not in value:
+            return value.decode(self.encoding)
+        return ET.fromstring(b'<a v="' + value + b'"/>',
+                             parser=ET.XMLParser(encoding=self.encoding)).get('v')
+
+    def _element(self, start, end):
+        parser = ET.XMLParser(encoding=self.encoding)
+        parser.feed(self._mmap[start:end])
+        return parser.close()
+
+    def __getitem__(self, folder_name):
+        return self.folders[folder_name]
+
+    def close(self):
+        '''Closes the file. Components already built can still be used.'''
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+
+# Everything below keeps an index of each export in a sidecar file next to
+# it, so that the export only has to be parsed once.
+
+# fields: (fieldtype, NAME, DATATYPE, PORTTYPE)-tuples
+# transformations: ComponentSummaries of the transformations defined
+#     inside a mapping or mapplet
+# instances: (NAME, TYPE, TRANSFORMATION_NAME, TRANSFORMATION_TYPE)-tuples
+# connectors: (FROMINSTANCE, FROMFIELD, TOINSTANCE, TOFIELD)-tuples
+ComponentSummary = namedtuple('ComponentSummary', [
+    'name', 'tag', 'type', 'fields', 'transformations',
+    'instances', 'connectors'
+])
+
+# Bump when the contents of the index change, to invalidate old indexes
+_index_version = 2
+_index_suffix = '.pwcindex'
+_folder_parts = Folder._fields[1:]
+_summarized_fields = ('SOURCEFIELD', 'TARGETFIELD', 'TRANSFORMFIELD',
+                      'MAPPINGVARIABLE')
+# The TYPE of elements that have no TYPE attribute
+_default_types = {
+    'SOURCE': 'Source Definition',
+    'TARGET': 'Target Definition',
+    'MAPPLET': 'Mapplet',
+    'MAPPING': 'Mapping',
+}
+
+def _summary(element):
+    # The summaries are stored as plain tuples, so that the index does
+    # not depend on the classes of this module. Strings are interned, so
+    # that repeated names and types are only stored once.
+    fields = []
+    transformations = []
+    instances = []
+    connectors = []
+    for sub in element:
+        tag = sub.tag
+        att = {name: intern(value) for name, value in sub.attrib.items()}
+        get = att.get
+        if tag in _summarized_fields:
+            fields.append((tag, get('NAME'), get('DATATYPE', ''), get('PORTTYPE', '')))
+        elif tag == 'TRANSFORMATION':
+            transformations.append(_summary(sub))
+        elif tag == 'INSTANCE':
+            instances.append((get('NAME'), get('TYPE'),
+                              get('TRANSFORMATION_NAME'), get('TRANSFORMATION_TYPE')))
+        elif tag == 'CONNECTOR':
+            connectors.append((get('FROMINSTANCE'), get('FROMFIELD'),
+                               get('TOINSTANCE'), get('TOFIELD')))
+    return (intern(element.get('NAME')), element.tag,
+            intern(element.get('TYPE', _default_types.get(element.tag, ''))),
+            tuple(fields), tuple(transformations),
+            tuple(instances), tuple(connectors))
+
+def _component_summary(summary):
+    name, tag, component_type, fields, transformations, instances, connectors = summary
+    return ComponentSummary(name, tag, component_type, fields,
+                            tuple(map(_component_summary, transformations)),
+                            instances, connectors)
+
+def _file_hash(path):
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# The index file holds three lines: a header identifying the export,
+# {folder name: (attributes, offsets)} and {folder name: summaries}, the
+# last two as JSON, so that reading an index cannot run any code.
+# LazyExport only reads the first two.
+
+_index_magic = b'PWCINDEX'
+
+def _header_line(header):
+    return b' '.join([_index_magic] + [str(header[key]).encode('ascii') for key
+                                       in ('version', 'size', 'mtime_ns', 'hash')]) + b'\n'
+
+def _parse_header(line):
+    magic, version, size, mtime_ns, hash_ = line.split()
+    if magic != _index_magic:
+        raise ValueError('Not an index')
+    return {'version': int(version), 'size': int(size),
+            'mtime_ns': int(mtime_ns), 'hash': hash_.decode('ascii')}
+
+def _dumps(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8') + b'\n'
+
+def _loads(line):
+    # JSON has no tuples, so the lists are turned back into tuples
+    def tuples(obj):
+        if isinstance(obj, list):
+            return tuple(map(tuples, obj))
+        if isinstance(obj, dict):
+            return {key: tuples(value) for key, value in obj.items()}
+        return obj
+    return tuples(json.loads(line.decode('utf-8')))
+
+def _write_index(path, header, body):
+    index_path = path + _index_suffix
+    directory, filename = os.path.split(os.path.abspath(index_path))
+    try:
+        fd, tmp_path = writer.mkstemp(prefix='.{}.'.format(filename),
+                                      suffix='.tmp', dir=directory)
+    except OSError:
+        # The index is only a cache, so exports in read-only
+        # directories are simply parsed every time
+        return
+    try:
+        with open(fd, 'wb') as file:
+            file.write(_header_line(header))
+            file.write(body)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def _read_index(path, summaries=False):
     '''
-    pwc = ET.parse(path)
-    root = pwc.getroot()
-    folder_content = root.findall('REPOSITORY/FOLDER/*')
-    top_level_folder_content = Counter([child.tag for child in folder_content])
+    Returns (folders, summaries) from the index of the export at path,
+    or None if there is no index, or if the export has changed since it
+    was written. summaries is None, unless summaries is True.
+    '''
+    try:
+        stat = os.stat(path)
+        file = open(path + _index_suffix, 'rb')
+    except OSError:
+        return None
+    with file:
+        try:
+            header = _parse_header(file.readline())
+            if (header.get('version') != _index_version
+                    or header.get('size') != stat.st_size):
+                return None
+            if header.get('mtime_ns') != stat.st_mtime_ns:
+                # The export has been touched, but is only reindexed if
+                # its content has changed as well
+                if header.get('hash') != _file_hash(path):
+                    return None
+                header['mtime_ns'] = stat.st_mtime_ns
+                body_start = file.tell()
+                _write_index(path, header, file.read())
+                file.seek(body_start)
+            folders = _loads(file.readline())
+            return folders, _loads(file.readline()) if summaries else None
+        except Exception:
+            # Unreadable or corrupt indexes are rebuilt
+            return None
+
+def _build_index(path):
+    '''Returns (header, folders, summaries) for the export at path.'''
+    stat = os.stat(path)
+    folders = {}
+    summaries = {}
+    with LazyExport(path, cache=False) as export:
+        for folder_name, folder in export.folders.items():
+            offsets = {part: dict(getattr(folder, part)._offsets)
+                       for part in _folder_parts}
+            folders[folder_name] = (folder.attributes, offsets)
+            summaries[folder_name] = {
+                part: {name: _summary(export._element(start, end))
+                       for name, (start, end) in offsets[part].items()}
+                for part in _folder_parts
+            }
+    header = {
+        'version': _index_version,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'hash': _file_hash(path),
+    }
+    return header, folders, summaries
+
+def index_xml(path, cache=True):
+    '''
+    Returns a summary of the components in the POWERMART XML file at
+    path, without building any pypwc objects.
+
+    The summary is returned as a dict of {folder name: Folder}, as
+    from_xml() does, but with a ComponentSummary in place of each
+    component. It holds the names, types and fields of the components,
+    and the instances and connectors of mappings and mapplets.
+
+    If cache is True, the index is written to a sidecar file next to the
+    export (path + '.pwcindex'), and read from there as long as the
+    export has not changed. An export whose modification time has
+    changed is hashed, and is only reindexed if its content has changed
+    as well.
+    '''
+    index = _read_index(path, summaries=True) if cache else None
+    if index is None:
+        header, folders, summaries = _build_index(path)
+        if cache:
+            _write_index(path, header,
+                         _dumps(folders) + _dumps(summaries))
+    else:
+        folders, summaries = index
+
+    return {
+        folder_name: Folder(attributes, *(
+            {name: _component_summary(summary)
+             for name, summary in summaries[folder_name][part].items()}
+            for part in _folder_parts))
+        for folder_name, (attributes, _) in folders.items()
+    }
 
-    m_ = component_from_xml(folder_content.findall('./MAPPING'))
-    non_mappings = (child.tag for child in folder_content if child.tag != 'MAPPING')
-    for component in non_mappings:
-        print(component)
-        m_.add_component(component_from_xml(component))
-    
 
 if __name__ == '__main__':
-    path = r'./m_test.xml'
-    from_xml(path)
\ No newline at end of file
+    # Run as a module of the package, e.g. python -m pypwc.from_xml export.xml
+    import sys
+    for folder_name, folder in from_xml(sys.argv[1]).items():
+        print('{}: {} mappings, {} mapplets'.format(
+            folder_name, len(folder.mappings), len(folder.mapplets)))
@@ -1,32 +1,42 @@
 from abc import ABCMeta, abstractmethod
 from copy import deepcopy
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
 import os
 import xml.etree.cElementTree as ET
-import xml.dom.minidom as minidom
+
+from . import writer
+from .graph import ConnectorGraph
+from .manifest import Manifest
+from .names import current_registry
+from .fields import Field, _projection
 
 __author__ = 'Simon Bugge Siggaard'
 __email__ = 'sbs@bec.dk'
 
+_missing = object()
+
 class Component(object):
     '''Anything that resides in a canvas should be a component
     and any combination of components should themselves be components.
 
     Implements the composite design pattern.'''
-    _names = []
     _allowed_component_types = ['SOURCE', 'TARGET', 'EXPRMACRO',
                         'TRANSFORMATION', 'MAPPLET', 'MAPPING',
                         'FOLDER', 'REPOSITORY', 'POWERMART',
                         'COMPOSITE']
-    _counter = 0
     def __init__(self, name, component_type):
         self._attributes = {}
         self._fields = []
+        self._reindex_fields()
         self._is_composite = False
         self.is_reusable = 'NO'
 
         self.parents = []
         self.children = []
+        # Mirrors parents and children, for constant time membership tests
+        self._parent_set = set()
+        self._child_set = set()
         self.connections = []
         self.table_attributes = {}
         self.valid_field_attribute_names = []
@@ -39,7 +49,7 @@ class Component(object):
         #     self.name = name
         #     Component._names.append(name)
         self.name = name
-        Component._names.append(name)
+        current_registry().register(self.name)
 
         assert isinstance(component_type, str)
         if component_type.upper() not in Component._allowed_component_types:
@@ -83,9 +93,12 @@ class Component(object):
 
 
     def _field_format_is_valid(self, field):
-        '''field must be of the form
+        '''field must be a Field or of the form
         (NAME, attrib_dict[, [nested_fields]])
         '''
+        if isinstance(field, Field):
+            msg = 'The format is valid'
+            return (True, msg)
         if not isinstance(field, tuple):
             msg = 'field is not a tuple'
             return (False, msg)
@@ -120,6 +133,18 @@ class Component(object):
         return (True, msg)
 
     def add_field(self, field):
+        if isinstance(field, Field):
+            # We want to purge incoming fields for attributes that are
+            # invalid. The values are picked straight from the field, and
+            # are shared with it if it has exactly the valid attributes.
+            pick, layout = _projection(field._layout,
+                                       tuple(self.valid_field_attribute_names))
+            new_field = Field.from_values(field.fieldtype, layout,
+                                          pick(field._values))
+            self.fields.append(new_field)
+            self._index_field(new_field)
+            return
+
         is_valid, msg = self._field_format_is_valid(field)
         if not is_valid:
             raise TypeError('Field format is incorrect with the following error message:\n{}'.format(msg))
@@ -127,16 +152,17 @@ class Component(object):
             # We want to purge incoming fields for attributes that
             # are invalid
             att = field[1]
-            new_att = {}
-            for valid_attribute in self.valid_field_attribute_names:
-                new_att[valid_attribute] = att[valid_attribute]
+            names = self.valid_field_attribute_names
+            values = [att[valid_attribute] for valid_attribute in names]
 
             if len(field) == 2:
-                new_field = (field[0], new_att)
+                new_field = Field.from_values(field[0], names, values)
             elif len(field) == 3:
+                new_att = dict(zip(names, values))
                 new_field = (field[0], new_att, field[2])
 
             self.fields.append(new_field)
+            self._index_field(new_field)
 
     def add_fields(self, fields):
         if not hasattr(fields, '__iter__'):
@@ -145,8 +171,78 @@ class Component(object):
             for field in fields:
                 self.add_field(field)
 
+    # The field index keeps the fields grouped by fieldtype, by the
+    # direction of TRANSFORMFIELD ports and by fieldtype and NAME, so that
+    # lookups do not have to scan self.fields. Code that changes the
+    # NAME or PORTTYPE of fields already added must call _reindex_fields().
+    _port_directions = ('INPUT', 'OUTPUT', 'INPUT/OUTPUT')
+
+    def _reindex_fields(self):
+        self._fields_by_type = {}
+        self._fields_by_port = {direction: [] for direction in self._port_directions}
+        self._fields_by_name = {}
+        for field in self._fields:
+            self._index_field(field)
+
+    # porttype: the directions of ports with that porttype
+    _porttype_directions = {}
+
+    def _port_directions_of(self, field):
+        if field[0] != 'TRANSFORMFIELD':
+            return ()
+        porttype = field[1].get('PORTTYPE', '')
+        directions = Component._porttype_directions.get(porttype)
+        if directions is None:
+            directions = tuple(d for d in self._port_directions if d in porttype)
+            Component._porttype_directions[porttype] = directions
+        return directions
+
+    def _index_field(self, field):
+        fieldtype, att = field[0], field[1]
+        self._fields_by_type.setdefault(fieldtype, []).append(field)
+        if fieldtype == 'TRANSFORMFIELD':
+            for direction in self._port_directions_of(field):
+                self._fields_by_port[direction].append(field)
+        name = att.get('NAME', _missing)
+        if name is not _missing:
+            # As when scanning the fields, the first field with a given
+            # name wins
+            self._fields_by_name.setdefault(fieldtype, {}).setdefault(name, field)
+
+    def _unindex_field(self, field):
+        fieldtype, att = field[0], field[1]
+        self._fields_by_type[fieldtype].remove(field)
+        for direction in self._port_directions_of(field):
+            self._fields_by_port[direction].remove(field)
+        name = att.get('NAME')
+        fields_by_name = self._fields_by_name.get(fieldtype, {})
+        if fields_by_name.get(name) is field:
+            del fields_by_name[name]
+            for other in self._fields_by_type[fieldtype]:
+                if other[1].get('NAME') == name:
+                    fields_by_name[name] = other
+                    break
+
+    def add_child(self, child):
+        '''Declares child a child of this component, and this component
+        a parent of child, unless they already are.'''
+        if child not in self._child_set:
+            self._child_set.add(child)
+            self.children.append(child)
+        if self not in child._parent_set:
+            child._parent_set.add(self)
+            child.parents.append(self)
+
     def get_all_fields_of_type(self, fieldtype):
-        return [f for f in self.fields if f[0] == fieldtype]
+        return list(self._fields_by_type.get(fieldtype, []))
+
+    def get_field_by_name(self, name, fieldtype='TRANSFORMFIELD'):
+        '''Returns the first field of fieldtype called name, or None
+        if there is no such field.'''
+        return self._fields_by_name.get(fieldtype, {}).get(name)
+
+    def has_field(self, name, fieldtype='TRANSFORMFIELD'):
+        return name in self._fields_by_name.get(fieldtype, ())
 
     def get_all_transformfields(self):
         return self.get_all_fields_of_type('TRANSFORMFIELD')
@@ -160,7 +256,7 @@ class Component(object):
         elif self.component_type == 'TARGET':
             return self.get_all_fields_of_type('TARGETFIELD')
         else:
-            return [tff for tff in self.get_all_transformfields() if 'INPUT' in tff[1]['PORTTYPE']]
+            return list(self._fields_by_port['INPUT'])
 
     def get_all_ofields(self):
         if self.component_type == 'SOURCE':
@@ -168,7 +264,7 @@ class Component(object):
         elif self.component_type == 'TARGET':
             return []
         else:
-            return [tff for tff in self.get_all_transformfields() if 'OUTPUT' in tff[1]['PORTTYPE']]
+            return list(self._fields_by_port['OUTPUT'])
         
     def get_all_iofields(self):
         if self.component_type == 'SOURCE':
@@ -176,19 +272,36 @@ class Component(object):
         elif self.component_type == 'TARGET':
             return self.get_all_fields_of_type('TARGETFIELD')
         else:
-            return [tff for tff in self.get_all_transformfields() if 'INPUT/OUTPUT' in tff[1]['PORTTYPE']]
+            return list(self._fields_by_port['INPUT/OUTPUT'])
 
     def replace_field(self, old_field, new_field):
         index_of_old = self.fields.index(old_field)
+        old_field = self.fields[index_of_old]
         self.fields[index_of_old] = new_field
+        if (old_field[0] == new_field[0]
+                and old_field[1].get('NAME') == new_field[1].get('NAME')
+                and self._port_directions_of(old_field) == self._port_directions_of(new_field)):
+            # The field keeps its place in every part of the index
+            for fields in ([self._fields_by_type[old_field[0]]]
+                           + [self._fields_by_port[d] for d in self._port_directions_of(old_field)]):
+                fields[fields.index(old_field)] = new_field
+            fields_by_name = self._fields_by_name.get(old_field[0], {})
+            name = old_field[1].get('NAME')
+            if fields_by_name.get(name) is old_field:
+                fields_by_name[name] = new_field
+        else:
+            self._reindex_fields()
 
     def replace_field_by_name(self, old_name, new_field):
-        old_field = [tf for tf in self.get_all_transformfields() if tf[1]['NAME'] == old_name][0]
+        old_field = self.get_field_by_name(old_name)
+        if old_field is None:
+            raise IndexError('There is no TRANSFORMFIELD named {}'.format(old_name))
         self.replace_field(old_field, new_field)
 
 
     def remove_field(self, field):
-        self.fields.remove(field)
+        field = self.fields.pop(self.fields.index(field))
+        self._unindex_field(field)
         
 
     def connect_to(self, OtherComponent, connect_dict):
@@ -196,16 +309,13 @@ class Component(object):
         OtherComponent becomes the child of the calling Component
         '''
         # Make sure that the two components in fact contain the fields from the dict
-        self_fields = self.get_all_transformfield_names()
-        if not set(connect_dict.keys()) <= set(self_fields):
+        if not all(map(self.has_field, connect_dict.keys())):
             raise ValueError('There are fields in connect_dict that are not contained in the set of TRANSFORMFIELDS')
-        other_fields = OtherComponent.get_all_transformfield_names()
-        if not set(connect_dict.values()) <= set(other_fields):
+        if not all(map(OtherComponent.has_field, connect_dict.values())):
             raise ValueError('There are fields in connect_dict that are not contained in the set of TRANSFORMFIELDS')
 
         # Declare children and parents
-        self.children.append(OtherComponent)
-        OtherComponent.parents.append(self)
+        self.add_child(OtherComponent)
 
         # Construct a new Component with the composite data, and return
         CompositeComponent = Composite(component_list=[self, OtherComponent])
@@ -219,7 +329,7 @@ class Component(object):
                 'FROMINSTANCETYPE': self.attributes['TYPE'],
                 'TOINSTANCETYPE': OtherComponent.attributes['TYPE']
             }
-            CompositeComponent.connection_list += [connection]
+            CompositeComponent.add_connection(connection)
 
         return CompositeComponent
 
@@ -238,6 +348,9 @@ class Component(object):
 
     def _add_subelements_to_root(self, root, fields):
         for f in fields:
+            if isinstance(f, Field):
+                ET.SubElement(root, f.fieldtype, attrib=f.attrib)
+                continue
             assert isinstance(f, tuple), 'f is type {}'.format(type(f))
             assert (len(f) == 2 or len(f) == 3), 'Length of fields-tuple is {}\n{}'.format(len(f), f)
             if len(f) == 2: # No nested fields
@@ -265,34 +378,33 @@ class Component(object):
                 # and MAPPLET.
             raise NotImplementedError('Not currently prioritized. As it stands right now, there is no real reason to handle the xml structure of composite Components.')
 
-    def write(self, path, encoding='utf-8'):
+    def _fingerprint_parts(self):
+        '''The state that as_xml() and as_instance() are built from.'''
+        return (type(self).__name__, self.component_type, self.is_reusable,
+                self.attributes, self.fields, self.table_attributes)
+
+    def fingerprint(self):
         '''
-        Reparse the one-lined default xml and write the prettified version to path.
+        Returns a hex digest of the content of the component. Components
+        that are written identically have the same fingerprint, and any
+        change to their attributes, fields or table attributes changes it.
         '''
+        digest = hashlib.blake2b(digest_size=16)
+        for part in self._fingerprint_parts():
+            digest.update(repr(part).encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
 
-        ugly_output = self.as_xml().write('./ugly_tmp.xml', encoding=encoding,
-                                            xml_declaration=False)
-
-        # Using the toprettyxml() method doesn't allow for us to specify
-        # neither version/encoding nor doctype. These have to be manually added
-        # before the fact.
-        version_and_encoding = '<?xml version="1.0" encoding="Windows-1252"?>\n'
-        doctype = '<!DOCTYPE POWERMART SYSTEM "powrmart.dtd">\n'
-        with open('./ugly_tmp.xml', mode='r') as ugly:
-            ugly_string = ugly.read()
-            reparsed = minidom.parseString(ugly_string)
-            with open(path, mode='w', encoding=encoding) as file:
-                file.write(version_and_encoding)
-                file.write(doctype)
-
-                # toprettyxml() also have the downside of automatically a version tag,
-                # without the option to disable it. We also have to remove this before
-                # writing to file.
-                pretty = reparsed.toprettyxml(indent='  ')
-                first_line_in_pretty = pretty.split('\n')[0] + '\n'
-                pretty_without_header = pretty.split(first_line_in_pretty)[-1]
-                file.write(pretty_without_header)
-        os.remove('./ugly_tmp.xml')
+    def as_string(self):
+        '''Returns the prettified xml, including version and doctype,
+        as a str.'''
+        return writer.tostring(self.as_xml())
+
+    def write(self, path, encoding='utf-8'):
+        '''
+        Write the prettified xml to path, which can be either a filename
+        or an open stream.
+        '''
+        writer.write(self.as_xml(), path, encoding=encoding)
 
 
 class Composite(Component):
@@ -308,6 +420,12 @@ class Composite(Component):
         'CREATION_DATE': _timestamp,
         'REPOSITORY_VERSION': '182.91'
         }
+    # The CREATION_DATE written in as_xml(). Either a datetime, a str
+    # formatted as _timestamp, or None. If None, the date is taken from
+    # the SOURCE_DATE_EPOCH environment variable, if it is set, and
+    # otherwise from powermart_attributes. Pin it, on the class or on a
+    # single composite, to make repeated writes byte-identical.
+    creation_date = None
     repository_attibutes = {
         'NAME': 'Dev_Repository',
         'VERSION': '182',
@@ -340,13 +458,24 @@ class Composite(Component):
         if connection_list is None:
             connection_list = []
         assert isinstance(connection_list, list), 'Expected a list; was {}'.format(type(connection_list))
-        self._connection_list = []
+        # Connections are kept in insertion order, keyed by id(), and
+        # indexed by (instance, field) in both directions. The number of
+        # connections between each pair of instances is kept as well,
+        # as {from instance: {to instance: count}} and the reverse.
+        self._connections = {}
+        self._connections_from = {}
+        self._connections_to = {}
+        self._instance_children = {}
+        self._instance_parents = {}
         self.add_connections(connection_list)
 
         if component_list is None:
             component_list = []
         assert isinstance(component_list, list), 'Expected a list; was {}'.format(type(component_list))
         self._component_list = []
+        self._component_set = set()
+        self._components_by_name = {}
+        self._classification = None
         self.add_components(component_list)
 
         if self.component_type == 'MAPPLET':
@@ -356,7 +485,7 @@ class Composite(Component):
 
         
 
-        for connection in self._connection_list:
+        for connection in self._connections.values():
             from_component_name = connection['FROMINSTANCE']
             from_component_field = connection['FROMFIELD']
             from_component_type = connection['FROMINSTANCETYPE']
@@ -364,24 +493,17 @@ class Composite(Component):
             to_component_field = connection['TOFIELD']
             to_component_type = connection['TOINSTANCETYPE']
 
-            assert from_component_name in self.component_list_names, \
+            FromComponent = self.get_component_by_name(from_component_name)
+            ToComponent = self.get_component_by_name(to_component_name)
+            assert FromComponent is not None, \
                     '{} not in component names {}'.format(from_component_name, self.component_list_names)
-            assert to_component_name in self.component_list_names, \
+            assert ToComponent is not None, \
                     '{} not in component names'.format(to_component_name)
-            FromComponent = [comp for comp in self._component_list
-                             if comp.name == from_component_name][0]
-            ToComponent = [comp for comp in self._component_list
-                             if comp.name == to_component_name][0]
 
-            assert (from_component_field
-                    in FromComponent.get_all_transformfield_names())
-            assert (to_component_field
-                    in ToComponent.get_all_transformfield_names())
+            assert FromComponent.has_field(from_component_field)
+            assert ToComponent.has_field(to_component_field)
 
-            if ToComponent not in FromComponent.children:
-                FromComponent.children.append(ToComponent)
-            if FromComponent not in ToComponent.parents:
-                ToComponent.parents.append(FromComponent)
+            FromComponent.add_child(ToComponent)
 
         self.attributes['DESCRIPTION'] = 'Composite made with pypwc (contact SBS for more information)'
 
@@ -396,7 +518,8 @@ class Composite(Component):
 
     @component_list.getter
     def component_list(self):
-        return self._component_list
+        '''A tuple of the components, in the order they were added.'''
+        return tuple(self._component_list)
 
     @component_list.setter
     def component_list(self, new_list):
@@ -409,7 +532,8 @@ class Composite(Component):
 
     @connection_list.getter
     def connection_list(self):
-        return self._connection_list
+        '''A tuple of the connections, in the order they were added.'''
+        return tuple(self._connections.values())
 
     @connection_list.setter
     def connection_list(self, new_list):
@@ -426,29 +550,85 @@ class Composite(Component):
             self.add_components(new_component.component_list)
             self.add_connections(new_component.connection_list)
             self.composites.append(new_component)
-        elif new_component.component_type == 'TARGET':
-            if new_component not in self._component_list:
+        elif new_component not in self._component_set:
+            if new_component.component_type == 'TARGET':
                 self.targets.append(new_component)
-                self._component_list.append(new_component)
-        elif new_component.component_type == 'SOURCE':
-            if new_component not in self._component_list:
+            elif new_component.component_type == 'SOURCE':
                 self.sources.append(new_component)
-                self._component_list.append(new_component)
-        else:
-            if new_component not in self._component_list:
-                self._component_list.append(new_component)
+            self._component_list.append(new_component)
+            self._component_set.add(new_component)
+            self._classification = None
+            self._components_by_name.setdefault(new_component.name, new_component)
 
     def add_components(self, new_components):
         for comp in new_components:
             self.add_component(comp)
 
+    def get_component_by_name(self, name):
+        '''
+        Returns the first component in component_list called name,
+        or None if there is no such component.
+        '''
+        component = self._components_by_name.get(name)
+        if component is None or component.name != name:
+            # Components may have been renamed after they were added
+            self._components_by_name = {}
+            for comp in self.component_list:
+                self._components_by_name.setdefault(comp.name, comp)
+            component = self._components_by_name.get(name)
+        return component
+
     def add_connection(self, new_connection):
-        self._connection_list.append(new_connection)
+        key = id(new_connection)
+        if key in self._connections:
+            return
+        self._connections[key] = new_connection
+        from_key = (new_connection['FROMINSTANCE'], new_connection['FROMFIELD'])
+        to_key = (new_connection['TOINSTANCE'], new_connection['TOFIELD'])
+        self._connections_from.setdefault(from_key, {})[key] = new_connection
+        self._connections_to.setdefault(to_key, {})[key] = new_connection
+        children = self._instance_children.setdefault(from_key[0], {})
+        children[to_key[0]] = children.get(to_key[0], 0) + 1
+        parents = self._instance_parents.setdefault(to_key[0], {})
+        parents[from_key[0]] = parents.get(from_key[0], 0) + 1
 
     def add_connections(self, new_connections):
         for conn in new_connections:
             self.add_connection(conn)
 
+    def _remove_connection(self, connection):
+        key = id(connection)
+        del self._connections[key]
+        from_key = (connection['FROMINSTANCE'], connection['FROMFIELD'])
+        to_key = (connection['TOINSTANCE'], connection['TOFIELD'])
+        del self._connections_from[from_key][key]
+        if not self._connections_from[from_key]:
+            del self._connections_from[from_key]
+        del self._connections_to[to_key][key]
+        if not self._connections_to[to_key]:
+            del self._connections_to[to_key]
+        for edges, instance, other in (
+                (self._instance_children, from_key[0], to_key[0]),
+                (self._instance_parents, to_key[0], from_key[0])):
+            edges[instance][other] -= 1
+            if not edges[instance][other]:
+                del edges[instance][other]
+                if not edges[instance]:
+                    del edges[instance]
+
+    def get_connections_from(self, component, field_name):
+        '''Returns the connections going out of field_name in component.'''
+        return list(self._connections_from.get((component.name, field_name), {}).values())
+
+    def get_connections_to(self, component, field_name):
+        '''Returns the connections going into field_name in component.'''
+        return list(self._connections_to.get((component.name, field_name), {}).values())
+
+    @property
+    def graph(self):
+        '''A ConnectorGraph of the connections in this composite.'''
+        return ConnectorGraph(self)
+
     @property
     def component_list_names(self):
         return [comp.name for comp in self.component_list]
@@ -460,13 +640,11 @@ class Composite(Component):
                 if ToComponent.component_type == 'TARGET' else 'TRANSFORMFIELD'
 
         # Make sure that the two components in fact contain the fields from the dict
-        from_fields = FromComponent.get_all_fields_of_type(from_field_type)
-        from_names = [ff[1]['NAME'] for ff in from_fields]
-        if not set(connect_dict.keys()) <= set(from_names):
+        if not all(FromComponent.has_field(name, from_field_type)
+                   for name in connect_dict.keys()):
             raise ValueError('There are fields in connect_dict that are not contained in the set of TRANSFORMFIELDS of FromComponent')
-        to_fields = ToComponent.get_all_fields_of_type(to_field_type)
-        to_names = [tf[1]['NAME'] for tf in to_fields]        
-        if not set(connect_dict.values()) <= set(to_names):
+        if not all(ToComponent.has_field(name, to_field_type)
+                   for name in connect_dict.values()):
             raise ValueError('There are fields in connect_dict that are not contained in the set of TRANSFORMFIELDS of ToComponent')
 
         if connect_dict:
@@ -480,13 +658,10 @@ class Composite(Component):
                     'FROMINSTANCETYPE': FromComponent.attributes['TYPE'],
                     'TOINSTANCETYPE': ToComponent.attributes['TYPE']
                 }
-                self.connection_list.append(connection)
+                self.add_connection(connection)
 
             # Declare children and parents
-            if ToComponent not in FromComponent.children:
-                FromComponent.children.append(ToComponent)
-            if FromComponent not in ToComponent.parents:
-                ToComponent.parents.append(FromComponent)
+            FromComponent.add_child(ToComponent)
 
     def connect_by_name(self, FromComponent, ToComponent):
         from_field_type = 'SOURCEFIELD' \
@@ -501,7 +676,10 @@ class Composite(Component):
             for fc in ToComponent.get_all_fields_of_type(to_field_type)
             ]
 
-        common_names = set(from_field_names).intersection(to_field_names)
+        # The connections are made in the order of the fields of
+        # FromComponent, so that the output does not depend on hashing
+        to_field_names = set(to_field_names)
+        common_names = [name for name in from_field_names if name in to_field_names]
         connect_dict = dict(zip(common_names, common_names))
         self.connect(FromComponent, ToComponent, connect_dict=connect_dict)
 
@@ -516,33 +694,23 @@ class Composite(Component):
                      connect_dict=dict(zip(from_field_names, to_field_names)))
 
     def remove_connection(self, output_tuple, input_tuple):
-        output_name = output_tuple[0].name
-        output_field = output_tuple[1]
+        output_component, output_field = output_tuple
         input_name = input_tuple[0].name
         input_field = input_tuple[1]
-        def _is_valid_connection(connection):
-            if (connection['FROMFIELD'] == output_field
-                and connection['TOFIELD'] == input_field
-                and connection['FROMINSTANCE'] == output_name
+        for connection in self.get_connections_from(output_component, output_field):
+            if (connection['TOFIELD'] == input_field
                 and connection['TOINSTANCE'] == input_name):
-                return True
-            else:
-                return False
-
-        connection_index = list(map(_is_valid_connection, self.connection_list)).index(True)
-        self.connection_list.remove(self.connection_list[connection_index])
+                self._remove_connection(connection)
+                return
+        raise ValueError('There is no connection from {} to {}'.format(output_tuple, input_tuple))
 
     def remove_all_connections_to(self, component, field_name):
-        connections = [c for c in self.connection_list
-                         if c['TOFIELD'] == field_name and c['TOINSTANCE'] == component.name]
-        for c in connections:
-            self.connection_list.remove(c)
+        for c in self.get_connections_to(component, field_name):
+            self._remove_connection(c)
     
     def remove_all_connections_from(self, component, field_name):
-        connections = [c for c in self.connection_list
-                         if c['FROMFIELD'] == field_name and c['FROMINSTANCE'] == component.name]
-        for c in connections:
-            self.connection_list.remove(c)
+        for c in self.get_connections_from(component, field_name):
+            self._remove_connection(c)
             
             
 
@@ -557,40 +725,65 @@ class Composite(Component):
 
         
 
+    def _classification_key(self):
+        # Components are only ever appended, so the length of the
+        # component list identifies its content
+        return (len(self._component_list), self.is_reusable)
+
+    def _classify_components(self):
+        '''
+        Returns the components in component_list bucketed by the way they
+        are written in as_xml(). The buckets are computed in a single pass
+        and cached until component_list changes.
+        '''
+        key = self._classification_key()
+        if self._classification is not None and self._classification[0] == key:
+            return self._classification[1]
+
+        buckets = {'MAPPLET': [], 'EXPRMACRO': [], 'REUSABLE': [],
+                   'COMPOSITE': [], 'GLOBAL': [], 'NON_GLOBAL': []}
+        for comp in self.component_list:
+            if isinstance(comp, Mapplet):
+                buckets['MAPPLET'].append(comp)
+            elif comp.component_type == 'EXPRMACRO':
+                buckets['EXPRMACRO'].append(comp)
+            elif (comp.component_type == 'TRANSFORMATION'
+                  and self.is_reusable == 'YES'):
+                buckets['REUSABLE'].append(comp)
+            elif comp.component_type == 'COMPOSITE':
+                buckets['COMPOSITE'].append(comp)
+            elif comp.component_type in ('TARGET', 'SOURCE'):
+                buckets['GLOBAL'].append(comp)
+            else:
+                buckets['NON_GLOBAL'].append(comp)
+
+        self._classification = (key, buckets)
+        return buckets
+
     def get_all_mapplets(self):
-        return [comp for comp in self.component_list if isinstance(comp, Mapplet)]
+        return list(self._classify_components()['MAPPLET'])
 
     def get_all_exprmacros(self):
-        return [comp for comp in self.component_list
-                if comp.component_type == 'EXPRMACRO']
+        return list(self._classify_components()['EXPRMACRO'])
 
     def get_all_reusable_transformations(self):
-        return [comp for comp in self.component_list
-                if (comp.component_type == 'TRANSFORMATION'
-                    and self.is_reusable == 'YES')]
+        return list(self._classify_components()['REUSABLE'])
 
     @property
     def composite_components(self):
-        return [comp for comp in self.component_list
-                if comp.component_type == 'COMPOSITE']
+        return list(self._classify_components()['COMPOSITE'])
 
     def get_all_connections(self):
         return []
 
     @property
     def all_non_global_components(self):
-        return [comp for comp in self.component_list
-                if (
-                    comp not in self.get_all_mapplets()
-                    and comp not in self.targets
-                    and comp not in self.sources
-                    and comp not in self.get_all_exprmacros()
-                    and comp not in self.get_all_reusable_transformations()
-                    and comp not in self.composite_components
-                )]
+        return list(self._classify_components()['NON_GLOBAL'])
 
     def as_xml(self):
-        powermart = ET.Element('POWERMART', attrib=Composite.powermart_attributes)
+        powermart = ET.Element('POWERMART', attrib=dict(
+            Composite.powermart_attributes,
+            CREATION_DATE=self._creation_date_string()))
         repository = ET.Element('REPOSITORY', attrib=Composite.repository_attibutes)
         folder = ET.Element('FOLDER', attrib=Composite.folder_attributes)
 
@@ -602,11 +795,12 @@ class Composite(Component):
             root.append(source.as_xml().getroot())
         for target in self.targets:
             root.append(target.as_xml().getroot())
-        for exprmacro in self.get_all_exprmacros():
+        buckets = self._classify_components()
+        for exprmacro in buckets['EXPRMACRO']:
             root.append(exprmacro.as_xml().getroot())
-        for reusable in self.get_all_reusable_transformations():
+        for reusable in buckets['REUSABLE']:
             root.append(reusable.as_xml().getroot())
-        for mapplet in self.get_all_mapplets():
+        for mapplet in buckets['MAPPLET']:
             mapplet_folder = mapplet.as_xml().findall('./REPOSITORY/FOLDER/*')
             for element in mapplet_folder:
                 root.append(element)
@@ -621,7 +815,7 @@ class Composite(Component):
         root.append(instance)
         root = instance
 
-        for component in self.all_non_global_components:
+        for component in buckets['NON_GLOBAL']:
             root.append(component.as_xml().getroot())
         for component in self.instance_transformations:
             root.append(component.as_xml().getroot())
@@ -632,46 +826,74 @@ class Composite(Component):
         for component in self.targets:
             root.append(component.load_order.getroot())
         for variable_field in self.mapping_variables:
-            ET.SubElement(root, 'MAPPINGVARIABLE', attrib=variable_field[1])
+            ET.SubElement(root, 'MAPPINGVARIABLE', attrib=dict(variable_field[1]))
         ET.SubElement(root, 'ERPINFO')
 
         return ET.ElementTree(powermart)
 
-    def write(self, path, encoding='utf-8'):
+    def _creation_date_string(self):
+        creation_date = self.creation_date
+        if creation_date is None:
+            epoch = os.environ.get('SOURCE_DATE_EPOCH')
+            if epoch is None:
+                return Composite.powermart_attributes['CREATION_DATE']
+            creation_date = datetime.fromtimestamp(int(epoch), timezone.utc)
+        if isinstance(creation_date, datetime):
+            return '{:02d}/{:02d}/{} {:02d}:{:02d}:{:02d}'.format(
+                creation_date.month, creation_date.day, creation_date.year,
+                creation_date.hour, creation_date.minute, creation_date.second)
+        return creation_date
+
+    def _fingerprint_parts(self):
+        # The creation date taken when the module is imported changes
+        # every run, and is left out, but a pinned date is part of the
+        # output like anything else
+        powermart_attributes = {key: value for key, value
+                                in Composite.powermart_attributes.items()
+                                if key != 'CREATION_DATE'}
+        creation_date = self._creation_date_string()
+        if creation_date != Composite._timestamp:
+            powermart_attributes['CREATION_DATE'] = creation_date
+        return (type(self).__name__, self.name, self.component_type,
+                self.is_reusable, self.attributes,
+                [component.fingerprint() for component in self.component_list],
+                list(self.connection_list), self.mapping_variables,
+                powermart_attributes, Composite.repository_attibutes,
+                Composite.folder_attributes)
+
+    def write(self, path, encoding='utf-8', force=False):
         '''
-        Write the result of the as_xml()-method to file, and prepends
+        Write the result of the as_xml()-method to path, and prepends
         xml version and doctype.
 
-        By default, as_xml() writes a one-lined version of the xml document,
-        so care is taken to prettify the output before writing.
+        The output is indented and written one element at a time, so
+        no intermediate copies of the document are kept in memory.
+        path can be either a filename or an open stream.
+
+        Files are recorded in a manifest in their directory, together
+        with the fingerprint of the composite. Unless force is True, the
+        file is skipped if it was written from an identical composite
+        and has not been changed since.
+        Use Manifest.batch() to save the manifest once, when writing many
+        files to the same directory.
+
+        Returns True if the file was written, and False if it was skipped.
         '''
+        if hasattr(path, 'write'):
+            writer.write(self.as_xml(), path, encoding=encoding)
+            return True
+
+        manifest = Manifest.for_file(path)
+        fingerprint = self.fingerprint()
+        if not force and manifest.is_current(path, fingerprint, encoding):
+            print('Skipped ' + str(path) + ' (unchanged)')
+            return False
 
-        # Write the one-lined output to a temporary file so as to be able
-        # to parse the xml separately later.
-        ugly_output = self.as_xml().write('./ugly_tmp.xml', encoding=encoding,
-                                            xml_declaration=False)
-
-        # Using the toprettyxml() method doesn't allow for us to specify
-        # neither version, encoding nor doctype. These have to be manually
-        # prepended,
-        version_and_encoding = '<?xml version="1.0" encoding="Windows-1252"?>\n'
-        doctype = '<!DOCTYPE POWERMART SYSTEM "powrmart.dtd">\n'
-        with open('./ugly_tmp.xml', mode='r') as ugly:
-            ugly_string = ugly.read()
-            reparsed = minidom.parseString(ugly_string)
-            with open(path, mode='w', encoding=encoding) as file:
-                file.write(version_and_encoding)
-                file.write(doctype)
-
-                # toprettyxml() also have the downside of automatically adding
-                # a version tag, without the option to disable it. We also have
-                # to remove this before writing to file.
-                pretty = reparsed.toprettyxml(indent='  ')
-                first_line_in_pretty = pretty.split('\n')[0] + '\n'
-                pretty_without_header = pretty.split(first_line_in_pretty)[-1]
-                file.write(pretty_without_header)
-        os.remove('./ugly_tmp.xml')
-        print('Wrote to ' + path)
+        writer.write(self.as_xml(), path, encoding=encoding)
+        manifest.record(path, fingerprint, encoding)
+        manifest.save()
+        print('Wrote to ' + str(path))
+        return True
 
 
 class Mapping(Composite):
@@ -683,19 +905,20 @@ class Mapping(Composite):
         self.attributes['DESCRIPTION'] = 'Mapping made with pypwc (contact SBS for more information)'
 
     def connect(self, FromComponent, ToComponent, connect_dict):
+        # Router groups, see Router.group(), only have output ports
+        assert not hasattr(ToComponent, 'parent_router'), \
+                'A Router group cannot be child of other transformations.'
         from_field_type = 'SOURCEFIELD' \
                 if FromComponent.component_type == 'SOURCE' else 'TRANSFORMFIELD'
         to_field_type = 'TARGETFIELD' \
                 if ToComponent.component_type == 'TARGET' else 'TRANSFORMFIELD'
 
         # Make sure that the two components in fact contain the fields from the dict
-        from_fields = FromComponent.get_all_fields_of_type(from_field_type)
-        from_names = [ff[1]['NAME'] for ff in from_fields]
-        if not set(connect_dict.keys()) <= set(from_names):
+        if not all(FromComponent.has_field(name, from_field_type)
+                   for name in connect_dict.keys()):
             raise ValueError('There are fields in connect_dict that are not contained in the set of TRANSFORMFIELDS of FromComponent')
-        to_fields = ToComponent.get_all_fields_of_type(to_field_type)
-        to_names = [tf[1]['NAME'] for tf in to_fields]        
-        if not set(connect_dict.values()) <= set(to_names):
+        if not all(ToComponent.has_field(name, to_field_type)
+                   for name in connect_dict.values()):
             raise ValueError('There are fields in connect_dict that are not contained in the set of TRANSFORMFIELDS of ToComponent')
 
         if connect_dict:
@@ -731,13 +954,10 @@ class Mapping(Composite):
                     'FROMINSTANCETYPE': frominstancetype,
                     'TOINSTANCETYPE': toinstancetype
                 }
-                self.connection_list.append(connection)
+                self.add_connection(connection)
 
             # Declare children and parents
-            if ToComponent not in FromComponent.children:
-                FromComponent.children.append(ToComponent)
-            if FromComponent not in ToComponent.parents:
-                ToComponent.parents.append(FromComponent)
+            FromComponent.add_child(ToComponent)
 
 
 class MappletIO(Component):
@@ -781,9 +1001,39 @@ class MappletIO(Component):
         assert isinstance(parent_mapplet, Mapplet), 'Parent must be Mapplet'
         self.parent_mapplet = parent_mapplet
 
+    # The parent mapplet caches the fields made from these, see
+    # Mapplet._io_transformation_fields(), so every change of the fields
+    # drops the cache. As for the field index, code that changes fields
+    # already added must call _reindex_fields().
+    def _fields_changed(self):
+        parent = getattr(self, 'parent_mapplet', None)
+        if parent is not None:
+            parent._io_cache = None
+
+    def add_field(self, field):
+        super().add_field(field)
+        self._fields_changed()
+
+    def replace_field(self, old_field, new_field):
+        super().replace_field(old_field, new_field)
+        self._fields_changed()
+
+    def remove_field(self, field):
+        super().remove_field(field)
+        self._fields_changed()
+
+    def _reindex_fields(self):
+        super()._reindex_fields()
+        self._fields_changed()
+
 class Mapplet(Composite):
     '''Represents a PowerCenter Mapplet transformation'''
     def __init__(self, name, component_list=None, connection_list=None):
+        # (key, list) and (key, input fields, output fields, instance
+        # transformations), computed from the input and output
+        # transformations when first needed, see _io_key()
+        self._component_list_cache = None
+        self._io_cache = None
         super().__init__(name, component_type='Mapplet',
                          component_list=component_list,
                          connection_list=connection_list)
@@ -803,53 +1053,72 @@ class Mapplet(Composite):
     @Composite.component_list.getter
     def component_list(self):
         if not self.input and not self.output:
-            # print('only component_list')
-            return self._component_list
-        elif self.input and not self.output:
-            # print('component_list and input')
-            return self._component_list + list(self.input.values())
-        elif not self.input and self.output:
-            # print('component_list and output')
-            return self._component_list + list(self.output.values())
-        else:
-            # print('component_list and input and output')
-            # print(self.output)
-            # print(self.input)
-            return self._component_list + list(self.input.values()) + list(self.output.values())
+            return tuple(self._component_list)
+        key = self._classification_key()
+        if self._component_list_cache is None or self._component_list_cache[0] != key:
+            self._component_list_cache = (key, tuple(self._component_list
+                                                     + list(self.input.values())
+                                                     + list(self.output.values())))
+        return self._component_list_cache[1]
+
+    def _classification_key(self):
+        # The input and output transformations are part of component_list
+        # as well, and can be replaced at any time
+        return (super()._classification_key()
+                + tuple(map(id, self.input.values()))
+                + tuple(map(id, self.output.values())))
+
+    def _io_key(self):
+        # The input and output transformations and their names. Changes
+        # to their fields drop the cache instead, see MappletIO.
+        return tuple((io, io.name) for io in
+                     list(self.input.values()) + list(self.output.values()))
+
+    def _io_transformation_fields(self):
+        key = self._io_key()
+        if self._io_cache is None or self._io_cache[0] != key:
+            input_fields = self._mapplet_fields(
+                self.input.values(), 'INPUT', 'Input Transformation')
+            output_fields = self._mapplet_fields(
+                self.output.values(), 'OUTPUT', 'Output Transformation')
+            InstanceTransformation = Component(current_registry().unique(self.name),
+                                                component_type='TRANSFORMATION')
+            InstanceTransformation.fields = input_fields + output_fields
+            InstanceTransformation.table_attributes = {
+                'Is Active': 'YES',
+                'Is Partitionable': 'NO',
+                'Form Name': ''}
+            self._io_cache = (key, input_fields, output_fields, [InstanceTransformation])
+        return self._io_cache[1:]
+
+    @staticmethod
+    def _mapplet_fields(ios, porttype, ref_instancetype):
+        fields = []
+        for io in ios:
+            for field in io.fields:
+                if isinstance(field, Field):
+                    attributes = dict(field[1])
+                else:
+                    field = deepcopy(field)
+                    attributes = field[1]
+                attributes.update({
+                    'MAPPLETGROUP': io.name,
+                    'PORTTYPE': porttype,
+                    'REF_FIELD': attributes['NAME'],
+                    'REF_INSTANCETYPE': ref_instancetype
+                })
+                if isinstance(field, Field):
+                    field = Field(field[0], attributes)
+                fields.append(field)
+        return fields
 
     @property
     def _input_transformation_fields(self):
-        input_fields = []
-        for input in self.input.values():
-            for input_field in input.fields:
-                input_field = deepcopy(input_field)
-                i_f = input_field[1]
-                i_f.update({
-                    'MAPPLETGROUP': input.name,
-                    'PORTTYPE': 'INPUT',
-                    'REF_FIELD': i_f['NAME'],
-                    'REF_INSTANCETYPE': 'Input Transformation'
-                })
-
-                input_fields.append(input_field)
-        return input_fields
+        return list(self._io_transformation_fields()[0])
 
     @property
     def _output_transformation_fields(self):
-        output_fields = []
-        for output in self.output.values():
-            for output_field in output.fields:
-                output_field = deepcopy(output_field)
-                o_f = output_field[1]
-                o_f.update({
-                    'MAPPLETGROUP': output.name,
-                    'PORTTYPE': 'OUTPUT',
-                    'REF_FIELD': o_f['NAME'],
-                    'REF_INSTANCETYPE': 'Output Transformation'
-                })
-
-                output_fields.append(output_field)
-        return output_fields
+        return list(self._io_transformation_fields()[1])
 
     @property
     def instance_transformations(self):
@@ -861,20 +1130,13 @@ class Mapplet(Composite):
         Mapplets contain a transformation containing information
         about the mapplet itself. This method returns the required
         information about these transformations.
-        '''
 
-
-        InstanceTransformation = Component('{0}{1}'.format(self.name, Component._counter),
-                                            component_type='TRANSFORMATION')
-        Component._counter += 1
-        InstanceTransformation.fields = self._input_transformation_fields + self._output_transformation_fields
-
-        InstanceTransformation.attributes = self.attributes
-        InstanceTransformation.table_attributes = {
-            'Is Active': 'YES',
-            'Is Partitionable': 'NO',
-            'Form Name': ''}
-        return [InstanceTransformation]
+        The transformation is made once, and again only when the input
+        or output transformations change.
+        '''
+        instance_transformations = self._io_transformation_fields()[2]
+        instance_transformations[0].attributes = self.attributes
+        return list(instance_transformations)
 
     @instance_transformations.setter
     def instance_transformations(self, value):
@@ -1,10 +1,8 @@
 from abc import ABCMeta, abstractmethod
 import xml.etree.cElementTree as ET
-import xml.dom.minidom as minidom
-from copy import deepcopy
 
 from .Canvas import Component
-from .fields import ofield
+from .fields import Field, ofield
 
 __author__ = 'Simon Bugge Siggaard'
 __email__ = 'sbs@bec.dk'
@@ -485,25 +483,95 @@ class Router(Transformation):
             self._name = value
 
     def group(self, group_name):
-        '''Returns a copy of the parent router, but all input and output fields
-        have their names adjusted by the group index of the group_name.'''
-        router_group = deepcopy(self)
-        for field in router_group.get_all_ifields():
-            # Add reference field to the router field
-            field[1]['REF_FIELD'] = field[1]['NAME']
-            # Add the group index to the name, based on the the group_name
-            field[1]['NAME'] += self.groups[group_name][2]
-            # Make the field belong to the correct group
-            field[1]['GROUP'] = group_name
-            # Make the field an output field
-            field[1]['PORTTYPE'] = 'OUTPUT'
+        '''Returns a RouterGroup, a view of the output ports of the group
+        group_name, which can be connected like any other transformation.'''
+        return RouterGroup(self, group_name)
 
-        return router_group
 
+class RouterGroup(object):
+    '''
+    A view of the output ports of a single group of a Router.
 
+    Every input port of the router has an output port in the group, with
+    the group index added to its name, and REF_FIELD, GROUP and PORTTYPE
+    set accordingly. The ports are made from the fields of the router
+    when they are asked for, so the view costs nothing to create and
+    always reflects the current fields of the router.
 
+    Connections from the view are connections from the router, and the
+    router becomes the parent of the connected transformations.
+    '''
+    def __init__(self, parent_router, group_name):
+        self.parent_router = parent_router
+        self.group_name = group_name
+        # Raises a KeyError for groups that do not exist
+        self.index = parent_router.groups[group_name][2]
 
-    
+    @property
+    def name(self):
+        return self.parent_router.name
+
+    @property
+    def attributes(self):
+        return self.parent_router.attributes
+
+    @property
+    def _type(self):
+        return self.parent_router._type
+
+    @property
+    def component_type(self):
+        return self.parent_router.component_type
+
+    def reference(self, name):
+        '''The name of the router port that the port name of the group
+        is made from, or None if the group has no port called name.'''
+        index = self.index
+        if not name.endswith(index):
+            return None
+        field = self.parent_router.get_field_by_name(name[:len(name)-len(index)])
+        if field is None or 'INPUT' not in field[1].get('PORTTYPE', ''):
+            return None
+        return field[1]['NAME']
+
+    def _port(self, field):
+        attributes = dict(field[1])
+        attributes['REF_FIELD'] = attributes['NAME']
+        attributes['NAME'] += self.index
+        attributes['GROUP'] = self.group_name
+        attributes['PORTTYPE'] = 'OUTPUT'
+        return Field(field[0], attributes)
+
+    @property
+    def fields(self):
+        return [self._port(field) for field in self.parent_router.get_all_ifields()]
+
+    def get_all_fields_of_type(self, fieldtype):
+        return self.fields if fieldtype == 'TRANSFORMFIELD' else []
+
+    def get_all_transformfields(self):
+        return self.fields
+
+    def get_all_transformfield_names(self):
+        return [field[1]['NAME'] for field in self.fields]
+
+    def get_all_ofields(self):
+        return self.fields
+
+    def get_all_ifields(self):
+        return []
+
+    def get_field_by_name(self, name, fieldtype='TRANSFORMFIELD'):
+        reference = self.reference(name) if fieldtype == 'TRANSFORMFIELD' else None
+        if reference is None:
+            return None
+        return self._port(self.parent_router.get_field_by_name(reference))
+
+    def has_field(self, name, fieldtype='TRANSFORMFIELD'):
+        return fieldtype == 'TRANSFORMFIELD' and self.reference(name) is not None
+
+    def add_child(self, child):
+        self.parent_router.add_child(child)
 
 
 class Sorter(Transformation):
@@ -572,6 +640,69 @@ class TransactionControl(Transformation):
             self._name = value
 
 
+class Source(Transformation):
+    '''Represents a source definition, e.g. a database table'''
+    def __init__(self, name='SRC', description=None,
+                     object_version='1', reusable='NO',
+                     version_number='1'):
+        super().__init__(type='Source Definition',
+                             name=name,
+                             description=description,
+                             object_version=object_version,
+                             reusable=reusable,
+                             version_number=version_number)
+
+        self.component_type = 'SOURCE'
+        self.business_name = ''
+        self.database_type = 'Netezza'
+        self.dbd_name = ''
+        self.owner_name = ''
+
+        self.table_attributes = {}
+
+        self.valid_field_attribute_names = [
+            'BUSINESSNAME', 'DATATYPE', 'DESCRIPTION',
+            'FIELDNUMBER', 'KEYTYPE', 'NAME',
+            'NULLABLE', 'PICTURETEXT', 'PRECISION', 'SCALE'
+        ]
+
+    def _set_name(self, value):
+        self._name = value
+
+    @property
+    def attributes(self):
+        return {
+            'BUSINESSNAME': self.business_name,
+            'DATABASETYPE': self.database_type,
+            'DBDNAME': self.dbd_name,
+            'DESCRIPTION': self._description,
+            'NAME': self.name,
+            'OBJECTVERSION': self.object_version,
+            'OWNERNAME': self.owner_name,
+            'VERSIONNUMBER': self.version_number
+        }
+
+    def as_instance(self):
+        att = self.attributes
+        attribute_dict = {
+            'DBDNAME': '' if not att['DBDNAME'] else att['DBDNAME'],
+            'DESCRIPTION': '' if not att['DESCRIPTION'] else att['DESCRIPTION'],
+            'NAME': '' if not att['NAME'] else att['NAME'],
+            'TRANSFORMATION_NAME': '' if not att['NAME'] else att['NAME'],
+            'TRANSFORMATION_TYPE': '' if not self.type else self.type,
+            'TYPE': '' if not self.component_type else self.component_type
+        }
+        root = ET.Element('INSTANCE', attrib=attribute_dict)
+        return ET.ElementTree(root)
+
+    def as_xml(self):
+        '''Returns an ElementTree with the apppropriate children
+        and attributes.'''
+        root = ET.Element(self.component_type, attrib=self.attributes)
+        self._add_subelements_to_root(root, self.fields)
+        return ET.ElementTree(root)
+
+
 class Target(Transformation):
     '''Docs'''
     def __init__(self, name='TRG', description=None,
@@ -650,6 +781,9 @@ class Target(Transformation):
                 # and MAPPLET.
             raise NotImplementedError('Not currently prioritized. As it stands right now, there is no real reason to handle the xml structure of composite Components.')
 
+    def _fingerprint_parts(self):
+        return super()._fingerprint_parts() + (self._load_order,)
+
     @property
     def load_order(self):
         pass
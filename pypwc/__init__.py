@@ -1,4 +1,40 @@
-from . import Canvas, Transformations, fields
+from . import Canvas, Transformations, fields, manifest, graph, lineage, names
+from .Canvas import Mapping, Mapplet, Component, Composite
+from .Transformations import (
+    Expression, SourceQualifier, UpdateStrategy, Filter, Aggregator, Lookup,
+    Sequence, Joiner, Normalizer, Rank, Router, RouterGroup, Sorter,
+    TransactionControl, Source, Target)
+from .fields import ifield, ofield, iofield, vfield, mvar, Field, fields_from_columns
+from .graph import ConnectorGraph
+from .lineage import Lineage, PortLineage
+from .names import NameRegistry, name_scope, current_registry
+
+import importlib
+
+# Modules, and names from modules, that are only imported when they are
+# first used (see PEP 562), as they import multiprocessing, asyncio and
+# the database layer
+_lazy_modules = {'batch', 'metadata', 'fakedb'}
+_lazy_names = {
+    'write_many': '.batch',
+    'WriteResult': '.batch',
+    'MetadataProvider': '.metadata',
+    'NetezzaBackend': '.metadata',
+    'SQLiteBackend': '.metadata',
+}
+
+def __getattr__(name):
+    if name in _lazy_modules:
+        value = importlib.import_module('.' + name, __name__)
+    elif name in _lazy_names:
+        value = getattr(importlib.import_module(_lazy_names[name], __name__), name)
+    else:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(set(globals()) | _lazy_modules | set(_lazy_names))
 
 __all__ = [
     # From Canvas:
@@ -6,9 +42,20 @@ __all__ = [
     # From Transformations:
     'Expression', 'SourceQualifier', 'UpdateStrategy',
     'Filter', 'Aggregator', 'Lookup', 'Sequence',
-    'Joiner', 'Normalizer', 'Rank', 'Router',
+    'Joiner', 'Normalizer', 'Rank', 'Router', 'RouterGroup',
     'Sorter', 'TransactionControl',
-    'Target',
+    'Source', 'Target',
     # from fields:
-    'ifield', 'ofield', 'iofield', 'vfield', 'mvar',
+    'ifield', 'ofield', 'iofield', 'vfield', 'mvar', 'Field',
+    'fields_from_columns',
+    # from batch:
+    'write_many', 'WriteResult',
+    # from graph:
+    'ConnectorGraph',
+    # from lineage:
+    'Lineage', 'PortLineage',
+    # from names:
+    'NameRegistry', 'name_scope', 'current_registry',
+    # from metadata:
+    'MetadataProvider', 'NetezzaBackend', 'SQLiteBackend',
     ]
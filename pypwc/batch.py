@@ -0,0 +1,118 @@
+'''
+A module for writing many Composites (usually Mappings) at once,
+spread across a pool of worker processes.
+'''
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import os
+import time
+import traceback
+
+from .Canvas import Composite
+from .manifest import Manifest
+from .names import name_scope
+from . import writer
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+WriteResult = namedtuple('WriteResult', [
+    'name', 'path', 'as_xml_seconds', 'write_seconds', 'error', 'skipped'
+])
+
+def _write_one(composite, path, encoding, creation_date):
+    '''Builds and writes a single composite. Runs inside the workers.'''
+    # Workers that are spawned, rather than forked, do not see a creation
+    # date pinned on the class in the calling process
+    Composite.creation_date = creation_date
+    # Workers are reused for many composites, so names registered while
+    # building the xml are dropped again afterwards.
+    as_xml_seconds = write_seconds = 0.0
+    try:
+        with name_scope():
+            start = time.perf_counter()
+            tree = composite.as_xml()
+            as_xml_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            writer.write(tree, path, encoding=encoding)
+            write_seconds = time.perf_counter() - start
+        error = None
+    except Exception:
+        error = traceback.format_exc()
+
+    return WriteResult(composite.name, path, as_xml_seconds,
+                       write_seconds, error, False)
+
+def write_many(composites, out_dir, workers=None, encoding='utf-8',
+               force=False):
+    '''
+    Write each composite to out_dir/<composite.name>.xml.
+
+    Parameters:
+    -----------
+    composites: an iterable of Composites
+        Usually Mappings. Every composite must have a unique name.
+
+    out_dir: str
+        The directory to write to. It is created if it does not exist.
+
+    workers: int (optional, default: None)
+        The number of worker processes. Defaults to the number of CPUs.
+        If workers is 1, everything is written in the calling process.
+
+    encoding: str (optional, default: 'utf-8')
+
+    force: bool (optional, default: False)
+        If False, composites that are unchanged since they were last
+        written to out_dir are skipped, as in Composite.write().
+
+    Returns:
+    --------
+    A list of WriteResults in the same order as composites. A composite
+    that failed has the formatted traceback in WriteResult.error; it
+    does not prevent the remaining composites from being written.
+    Skipped composites have WriteResult.skipped set to True.
+    '''
+    composites = list(composites)
+    names = [comp.name for comp in composites]
+    if len(set(names)) != len(names):
+        raise ValueError('The names of the composites must be unique.')
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = [os.path.join(out_dir, '{}.xml'.format(name)) for name in names]
+
+    # The manifest is only read and written here, never in the workers
+    manifest = Manifest(out_dir)
+    fingerprints = [comp.fingerprint() for comp in composites]
+    results = [None]*len(composites)
+    pending = []
+    for i, (comp, path, fingerprint) in enumerate(zip(composites, paths, fingerprints)):
+        if not force and manifest.is_current(path, fingerprint, encoding):
+            results[i] = WriteResult(comp.name, path, 0.0, 0.0, None, True)
+        else:
+            pending.append(i)
+
+    if workers == 1:
+        for i in pending:
+            results[i] = _write_one(composites[i], paths[i], encoding,
+                                    Composite.creation_date)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_write_one, composites[i], paths[i],
+                                       encoding, Composite.creation_date)
+                       for i in pending]
+            for i, future in zip(pending, futures):
+                try:
+                    results[i] = future.result()
+                except Exception:
+                    # E.g. the composite could not be sent to the worker
+                    results[i] = WriteResult(names[i], paths[i], 0.0, 0.0,
+                                             traceback.format_exc(), False)
+
+    for i in pending:
+        if results[i].error is None:
+            manifest.record(paths[i], fingerprints[i], encoding)
+    if pending:
+        manifest.save()
+    return results
@@ -0,0 +1,166 @@
+'''
+A module with a fake database server, for running the metadata functions
+offline, e.g. in tests. The server answers queries from SQLite databases,
+over a socket on the local machine, optionally with a delay to mimic the
+round trips to a real database.
+'''
+import datetime
+import decimal
+import json
+import socket
+import socketserver
+import threading
+import time
+
+from .metadata import Backend, CatalogColumn, QueryResult, SQLiteBackend
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+# The type codes of descriptions, as sent between server and client
+_type_codes = {
+    'int': int,
+    'Decimal': decimal.Decimal,
+    'str': str,
+    'datetime': datetime.datetime,
+}
+_type_names = {type_code: name for name, type_code in _type_codes.items()}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    '''Answers the requests of a single client connection, one JSON
+    object per line, until the client disconnects.'''
+    def handle(self):
+        server = self.server.database
+        # env: connection
+        connections = {}
+        try:
+            for line in self.rfile:
+                request = json.loads(line.decode('utf-8'))
+                env = request['env']
+                if env not in connections:
+                    connections[env] = server.sqlite.connect(env)
+                if server.latency:
+                    time.sleep(server.latency)
+                try:
+                    response = self._answer(server.sqlite, connections[env], request)
+                except Exception as error:
+                    response = {'error': '{}: {}'.format(type(error).__name__, error)}
+                with server._lock:
+                    server.requests += 1
+                self.wfile.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+                self.wfile.flush()
+        finally:
+            for connection in connections.values():
+                server.sqlite.close(connection)
+
+    def _answer(self, backend, connection, request):
+        if request['op'] == 'query':
+            data, column_names, descriptions = backend.query(connection, request['sql'])
+            return {
+                'data': [list(row) for row in data],
+                'column_names': list(column_names),
+                'descriptions': [[d[0], _type_names[d[1]]] + list(d[2:]) for d in descriptions],
+            }
+        elif request['op'] == 'catalog':
+            return {'columns': [list(column) for column in
+                                backend.catalog(connection, request['tables'])]}
+        raise ValueError('Unknown op: {}'.format(request['op']))
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeDatabaseServer(object):
+    '''
+    A database server on the local machine, answering queries from the
+    SQLite databases of an SQLiteBackend(path, setup). Every request is
+    delayed by latency seconds. Use backend() to connect to it, e.g.
+
+    >>> with FakeDatabaseServer(setup='CREATE TABLE T (ID BIGINT)', latency=0.05) as server:
+    ...     provider = MetadataProvider(server.backend())
+    ...     target = utils.target_from_sql('SELECT * FROM T', provider=provider)
+    '''
+    def __init__(self, path=':memory:', setup=None, latency=0.0,
+                 host='127.0.0.1', port=0):
+        self.sqlite = SQLiteBackend(path=path, setup=setup)
+        self.latency = latency
+        # The number of requests answered
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.database = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._server.serve_forever,
+                                            name='pypwc-fakedb', daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def backend(self):
+        '''Returns a FakeDatabaseBackend connecting to this server.'''
+        return FakeDatabaseBackend(self.address)
+
+
+class _Connection(object):
+    def __init__(self, address, env):
+        self.env = env
+        self.socket = socket.create_connection(address)
+        self.file = self.socket.makefile('rwb')
+
+    def request(self, **request):
+        request['env'] = self.env
+        self.file.write(json.dumps(request).encode('utf-8') + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError('The fake database server closed the connection')
+        response = json.loads(line.decode('utf-8'))
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response
+
+    def close(self):
+        self.file.close()
+        self.socket.close()
+
+
+class FakeDatabaseBackend(Backend):
+    '''The databases of a FakeDatabaseServer at address.'''
+    def __init__(self, address):
+        self.address = tuple(address)
+
+    def connect(self, env):
+        return _Connection(self.address, env)
+
+    def query(self, connection, sql):
+        response = connection.request(op='query', sql=sql)
+        descriptions = [(d[0], _type_codes[d[1]]) + tuple(d[2:])
+                        for d in response['descriptions']]
+        return QueryResult([tuple(row) for row in response['data']],
+                           response['column_names'], descriptions)
+
+    def catalog(self, connection, tables):
+        response = connection.request(op='catalog', tables=list(tables))
+        return [CatalogColumn(*column) for column in response['columns']]
@@ -1,4 +1,7 @@
+from collections.abc import MutableMapping
+from operator import itemgetter
 import re
+import sys
 
 '''
 A module containing functions that generate TRANSFORMFIELDS
@@ -8,6 +11,194 @@ without the boilerplate.
 __author__ = 'Simon Bugge Siggaard'
 __email__ = 'sbs@bec.dk'
 
+
+class _Layout(object):
+    '''The attribute names of a Field and their positions. A single
+    _Layout is shared by all fields with the same attribute names.'''
+    __slots__ = ('names', 'positions')
+
+    def __init__(self, names):
+        self.names = names
+        self.positions = {name: i for i, name in enumerate(names)}
+
+    def __reduce__(self):
+        return (_layout, (self.names,))
+
+_layouts = {}
+
+def _layout(names):
+    names = tuple(names)
+    layout = _layouts.get(names)
+    if layout is None:
+        names = tuple(map(sys.intern, names))
+        layout = _layouts.setdefault(names, _Layout(names))
+    return layout
+
+# (layout, names): (function picking the values of names from the values
+# of a field with layout, _Layout of names)
+_projections = {}
+
+def _projection(layout, names):
+    '''Returns (pick, new_layout), where pick(values) returns the values
+    of names, in order, from the values of a field with layout. Raises
+    a KeyError if a name is not in layout.'''
+    key = (layout, names)
+    projection = _projections.get(key)
+    if projection is None:
+        positions = [layout.positions[name] for name in names]
+        if tuple(names) == layout.names:
+            # The values tuple is shared, as it is never changed in place
+            pick = lambda values: values
+        elif len(positions) == 1:
+            position = positions[0]
+            pick = lambda values: (values[position],)
+        elif positions:
+            pick = itemgetter(*positions)
+        else:
+            pick = lambda values: ()
+        projection = _projections.setdefault(key, (pick, _layout(names)))
+    return projection
+
+
+class _FieldAttributes(MutableMapping):
+    '''A dict-like view of the attributes of a Field. Changes to the
+    view are written directly to the Field.'''
+    __slots__ = ('_field',)
+
+    def __init__(self, field):
+        self._field = field
+
+    def __getitem__(self, name):
+        field = self._field
+        return field._values[field._layout.positions[name]]
+
+    def __setitem__(self, name, value):
+        field = self._field
+        values = field._values
+        position = field._layout.positions.get(name)
+        if position is None:
+            field._layout = _layout(field._layout.names + (name,))
+            field._values = values + (value,)
+        else:
+            field._values = values[:position] + (value,) + values[position+1:]
+
+    def __delitem__(self, name):
+        field = self._field
+        position = field._layout.positions[name]
+        names = field._layout.names
+        values = field._values
+        field._layout = _layout(names[:position] + names[position+1:])
+        field._values = values[:position] + values[position+1:]
+
+    def __contains__(self, name):
+        return name in self._field._layout.positions
+
+    def get(self, name, default=None):
+        # Faster than the get() of MutableMapping, which goes through
+        # __getitem__ and catches the KeyError
+        return self._field.get(name, default)
+
+    def __iter__(self):
+        return iter(self._field._layout.names)
+
+    def __len__(self):
+        return len(self._field._layout.names)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def copy(self):
+        return dict(self)
+
+
+class Field(object):
+    '''
+    A compact record of a single field, e.g. a TRANSFORMFIELD.
+
+    The attribute names are shared between all fields with the same
+    attributes, so every field only stores a tuple of its values. For
+    compatibility, a Field behaves like the tuple
+    (fieldtype, attribute_dict) that was previously used for fields:
+
+    >>> field = ifield('test', 'integer')
+    >>> fieldtype, attributes = field
+    >>> fieldtype
+    'TRANSFORMFIELD'
+    >>> attributes['NAME']
+    'test'
+    >>> field == ('TRANSFORMFIELD', dict(attributes))
+    True
+    '''
+    __slots__ = ('fieldtype', '_layout', '_values')
+
+    def __init__(self, fieldtype, attributes=()):
+        attributes = dict(attributes)
+        self.fieldtype = fieldtype
+        self._layout = _layout(attributes.keys())
+        self._values = tuple(attributes.values())
+
+    @classmethod
+    def from_values(cls, fieldtype, names, values):
+        '''Create a Field from a sequence of attribute names (or a
+        _Layout) and a sequence of values of the same length.'''
+        field = cls.__new__(cls)
+        field.fieldtype = fieldtype
+        field._layout = names if isinstance(names, _Layout) else _layout(names)
+        field._values = tuple(values)
+        return field
+
+    def replace(self, **attributes):
+        '''Returns a new Field with attributes set. The new field shares
+        its attribute names and unchanged values with this field.'''
+        layout = self._layout
+        values = list(self._values)
+        for name, value in attributes.items():
+            position = layout.positions.get(name)
+            if position is None:
+                layout = _layout(layout.names + (name,))
+                values.append(value)
+            else:
+                values[position] = value
+        return Field.from_values(self.fieldtype, layout, values)
+
+    @property
+    def attrib(self):
+        '''The attributes as a new dict, ready to be used as
+        attributes of an xml element.'''
+        return dict(zip(self._layout.names, self._values))
+
+    def get(self, name, default=None):
+        position = self._layout.positions.get(name)
+        return default if position is None else self._values[position]
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        if index in (0, -2):
+            return self.fieldtype
+        elif index in (1, -1):
+            return _FieldAttributes(self)
+        raise IndexError('Field index out of range')
+
+    def __iter__(self):
+        yield self.fieldtype
+        yield _FieldAttributes(self)
+
+    def __eq__(self, other):
+        if isinstance(other, Field):
+            return (self.fieldtype == other.fieldtype
+                    and self.attrib == other.attrib)
+        elif isinstance(other, tuple):
+            return len(other) == 2 and tuple(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr((self.fieldtype, self.attrib))
+
+
 static_precision_dict = {
     'bigint': '19',
     'date/time': '29',
@@ -44,6 +235,49 @@ variable_scale_default_dict = {
     'decimal': '0'
 }
 
+# Everything needed to validate a datatype and resolve its precision and
+# scale in a single lookup:
+# datatype: (static precision, default precision, static scale, default scale)
+# where a static value always overrides the given one, and a default value
+# is only used when none is given.
+_datatype_specs = {
+    datatype: (static_precision_dict.get(datatype),
+               variable_precision_default_dict.get(datatype),
+               static_scale_dict.get(datatype),
+               variable_scale_default_dict.get(datatype))
+    for datatype in ['bigint', 'binary', 'date/time', 'decimal', 'double',
+                     'integer', 'nstring', 'ntext', 'real', 'small integer',
+                     'string', 'text']
+}
+
+_allowed_datatypes = frozenset(_datatype_specs)
+
+_porttypes = frozenset(['input', 'output', 'input/output', 'local variable'])
+
+_whitespace = re.compile(r'\s+')
+
+# The attributes of the fields, in the order they are written
+_transformfield_names = (
+    'DATATYPE', 'DEFAULTVALUE', 'DESCRIPTION', 'EXPRESSION', 'EXPRESSIONTYPE',
+    'NAME', 'PICTURETEXT', 'PORTTYPE', 'PRECISION', 'SCALE', 'ISSORTKEY',
+    'SORTDIRECTION', 'GROUP'
+)
+
+_targetfield_names = (
+    'BUSINESSNAME', 'DATATYPE', 'DESCRIPTION', 'FIELDNUMBER', 'KEYTYPE',
+    'NAME', 'NULLABLE', 'PICTURETEXT', 'PRECISION', 'SCALE'
+)
+
+_mvar_names = (
+    'NAME', 'DATATYPE', 'DEFAULTVALUE', 'DESCRIPTION', 'ISEXPRESSIONVARIABLE',
+    'ISPARAM', 'PRECISION', 'SCALE', 'USERDEFINED'
+)
+
+_transformfield_layout = _layout(_transformfield_names)
+_targetfield_layout = _layout(_targetfield_names)
+_mvar_layout = _layout(_mvar_names)
+_mvar_aggfunction_layout = _layout(_mvar_names + ('AGGFUNCTION',))
+
 def transformfield(*, porttype, name, datatype,
             default_value='', description='', expression='',
             expressiontype='', picture_text='', precision='',
@@ -52,65 +286,39 @@ def transformfield(*, porttype, name, datatype,
 
     # input validation
     assert isinstance(porttype, str), 'Expected str; was {}'.format(type(porttype))
-    assert porttype.lower() in ['input', 'output', 'input/output', 'local variable'], \
+    lower_porttype = porttype.lower()
+    assert lower_porttype in _porttypes, \
             r"porttype must be either 'input', 'output', 'input/output' or 'local variable', was {}".format(porttype)
     assert isinstance(name, str), 'Expected str; was {}'.format(type(name))
     assert isinstance(datatype, str), 'Expected str; was {}'.format(type(datatype))
-    allowed_datatypes = ['bigint', 'binary', 'date/time', 'decimal', 'double',
-                        'integer', 'nstring', 'ntext', 'real', 'small integer',
-                        'string', 'text']
-    assert datatype in allowed_datatypes, 'Datatype must be in {}'.format(allowed_datatypes)
+    spec = _datatype_specs.get(datatype)
+    assert spec is not None, 'Datatype must be in {}'.format(list(_datatype_specs))
     assert isinstance(precision, str), 'Expected str; was {}'.format(type(precision))
     assert isinstance(scale, str), 'Expected str; was {}'.format(type(scale))
     assert not precision or precision.isdigit(), 'Precision must be a positive integer'
     assert not scale or scale.isdigit(), 'Scale must be a positive integer'
     assert isinstance(master, bool), 'Expected a bool; was {}'.format(type(master))
     assert isinstance(group, str), 'Group must be a str, was {}'.format(type(group))
-                
-    precision_is_static = datatype in static_precision_dict
-    precision_is_variable = datatype in variable_precision_default_dict
-    scale_is_static = datatype in static_scale_dict
-    scale_is_variable = datatype in variable_scale_default_dict
 
     # Strip unnecessary whitespace from descriptions
-    description = re.sub('\s+', ' ', description).strip()
-    
-
-    if precision_is_static:
-        precision = static_precision_dict[datatype]
-    elif not precision:
-        precision = variable_precision_default_dict[datatype]
-    if scale_is_static:
-        scale = static_scale_dict[datatype]
-    elif not scale:
-        scale = variable_scale_default_dict[datatype]
-
-    if porttype.lower() == 'input':
-        expression = "{}".format(name)
-    elif porttype.lower() == 'input/output':
-        expression = "{}".format(name)
+    if description:
+        description = _whitespace.sub(' ', description).strip()
+
+    static_precision, default_precision, static_scale, default_scale = spec
+    precision = static_precision or precision or default_precision
+    scale = static_scale or scale or default_scale
+
+    if lower_porttype == 'input' or lower_porttype == 'input/output':
+        expression = name
 
     if master:
         porttype += '/MASTER'
 
-       
-    field_dict = dict([
-        ('DATATYPE', datatype),
-        ('DEFAULTVALUE', default_value),
-        ('DESCRIPTION', description),
-        ('EXPRESSION', expression),
-        ('EXPRESSIONTYPE', expressiontype),
-        ('NAME', name),
-        ('PICTURETEXT', picture_text),
-        ('PORTTYPE', porttype),
-        ('PRECISION', precision),
-        ('SCALE', scale),
-        ('ISSORTKEY', issortkey),
-        ('SORTDIRECTION', sortdirection),
-        ('GROUP', group)
+    return Field.from_values('TRANSFORMFIELD', _transformfield_layout, [
+        datatype, default_value, description, expression, expressiontype,
+        name, picture_text, porttype, precision, scale, issortkey,
+        sortdirection, group
     ])
-   
-    return ('TRANSFORMFIELD', field_dict)
 
 
 def ifield(name, datatype,
@@ -178,26 +386,219 @@ def targetfield(name, datatype,
     assert not scale or scale.isdigit(), 'Scale must be a positive integer'
 
     # Strip unnecessary whitespace from descriptions
-    description = re.sub('\s+', ' ', description).strip()
-
-    field_dict = dict([
-        ('BUSINESSNAME', businessname),
-        ('DATATYPE', datatype),
-        ('DESCRIPTION', description),
-        ('FIELDNUMBER', fieldnumber),
-        ('KEYTYPE', keytype),
-        ('NAME', name),
-        ('NULLABLE', nullable),
-        ('PICTURETEXT', picture_text),
-        ('PRECISION', precision),
-        ('SCALE', scale),
+    if description:
+        description = _whitespace.sub(' ', description).strip()
+
+    return Field.from_values('TARGETFIELD', _targetfield_layout, [
+        businessname, datatype, description, fieldnumber, keytype,
+        name, nullable, picture_text, precision, scale
     ])
-   
-    return ('TARGETFIELD', field_dict)
 
 def name_of_field(field):
     return field[1]['NAME']
 
+# The attributes of a field that passthru_field() uses
+_passthru_names = ('NAME', 'DATATYPE', 'DESCRIPTION', 'PICTURETEXT', 'PRECISION', 'SCALE')
+
+def passthru_field(field, datatype=None):
+    '''
+    Returns the INPUT/OUTPUT port passing the value of field through,
+    the same port as iofield() makes from the name, datatype, description,
+    picture text, precision and scale of field.
+
+    The values of field are used as they are, and are not validated
+    again. If datatype is given, it is used instead of the DATATYPE of
+    field, e.g. for TARGETFIELDs with database datatypes.
+    '''
+    if isinstance(field, Field):
+        pick = _projection(field._layout, _passthru_names)[0]
+        name, field_datatype, description, picture_text, precision, scale = \
+            pick(field._values)
+    else:
+        att = field[1]
+        name, field_datatype, description, picture_text, precision, scale = \
+            [att[attribute] for attribute in _passthru_names]
+    if datatype is None:
+        datatype = field_datatype
+    spec = _datatype_specs.get(datatype)
+    if spec is None:
+        # Fail as iofield() does
+        return iofield(name, datatype)
+    if description:
+        description = _whitespace.sub(' ', description).strip()
+    static_precision, default_precision, static_scale, default_scale = spec
+    return Field.from_values('TRANSFORMFIELD', _transformfield_layout, (
+        datatype, '', description, name, 'GENERAL', name, picture_text,
+        'INPUT/OUTPUT', static_precision or precision or default_precision,
+        static_scale or scale or default_scale, 'NO', 'ASCENDING',
+        'INPUT/OUTPUT'
+    ))
+
+# The optional columns of fields_from_columns(), as
+# keyword: (attribute, default)
+_transformfield_columns = {
+    'default_value': ('DEFAULTVALUE', ''),
+    'description': ('DESCRIPTION', ''),
+    'expression': ('EXPRESSION', ''),
+    'expressiontype': ('EXPRESSIONTYPE', 'GENERAL'),
+    'picture_text': ('PICTURETEXT', ''),
+    'issortkey': ('ISSORTKEY', 'NO'),
+    'sortdirection': ('SORTDIRECTION', 'ASCENDING'),
+    'group': ('GROUP', None)     # Defaults to the group of the porttype
+}
+
+_targetfield_columns = {
+    'businessname': ('BUSINESSNAME', ''),
+    'keytype': ('KEYTYPE', 'NOT A KEY'),
+    'nullable': ('NULLABLE', ''),
+    'description': ('DESCRIPTION', ''),
+    'fieldnumber': ('FIELDNUMBER', ''),
+    'picture_text': ('PICTURETEXT', '')
+}
+
+_porttype_groups = {
+    'INPUT': 'INPUT',
+    'OUTPUT': 'OUTPUT',
+    'INPUT/OUTPUT': 'INPUT/OUTPUT',
+    'LOCAL VARIABLE': 'VARIABLE'
+}
+
+def _as_str(value):
+    # Columns from databases and NumPy contain ints, None and NumPy scalars
+    if value is None:
+        return ''
+    elif isinstance(value, bytes):
+        return value.decode()
+    return str(value)
+
+def fields_from_columns(names, datatypes=None, precisions=None, scales=None,
+                        *, porttype='INPUT/OUTPUT', fieldtype='TRANSFORMFIELD',
+                        **columns):
+    '''
+    Create many fields at once from a columnar description, e.g. the
+    columns of a table.
+
+    Parameters:
+    -----------
+    names: a sequence of str, or a NumPy structured array
+        If a structured array is given, the remaining columns are read
+        from its fields with the same names as the parameters, i.e.
+        'name', 'datatype', 'precision', 'scale', 'description', etc.
+
+    datatypes: a sequence of str
+
+    precisions, scales: sequences of str or int (optional)
+        Empty or None values are replaced by the defaults of the
+        datatype, as in ifield(). Ignored for datatypes with a static
+        precision or scale.
+
+    porttype: str (optional, default: 'INPUT/OUTPUT')
+        One of 'input', 'output', 'input/output' or 'local variable'.
+        Only used for TRANSFORMFIELDs.
+
+    fieldtype: str (optional, default: 'TRANSFORMFIELD')
+        Either 'TRANSFORMFIELD' or 'TARGETFIELD'.
+
+    **columns: sequences
+        Any other keyword accepted by ifield() (for TRANSFORMFIELDs) or
+        targetfield() (for TARGETFIELDs), given as a column, e.g.
+        description=[...] or nullable=[...].
+
+    Returns:
+    --------
+    A list of Fields, equal to the fields created one at a time by
+    ifield()/ofield()/iofield()/vfield() or targetfield().
+
+    Examples:
+    ---------
+    >>> fields = fields_from_columns(['ID', 'NAME'], ['bigint', 'nstring'],
+    ...                              precisions=['', '50'], porttype='output')
+    >>> [(field[1]['NAME'], field[1]['PRECISION'], field[1]['PORTTYPE']) for field in fields]
+    [('ID', '19', 'OUTPUT'), ('NAME', '50', 'OUTPUT')]
+    >>> fields == [ofield('ID', 'bigint'), ofield('NAME', 'nstring', precision='50')]
+    True
+    '''
+    if getattr(getattr(names, 'dtype', None), 'names', None):
+        table = names
+        names = table['name']
+        if datatypes is None:
+            datatypes = table['datatype']
+        if precisions is None and 'precision' in table.dtype.names:
+            precisions = table['precision']
+        if scales is None and 'scale' in table.dtype.names:
+            scales = table['scale']
+        for column in table.dtype.names:
+            if column not in ('name', 'datatype', 'precision', 'scale'):
+                columns.setdefault(column, table[column])
+
+    assert fieldtype in ('TRANSFORMFIELD', 'TARGETFIELD'), \
+            "fieldtype must be either 'TRANSFORMFIELD' or 'TARGETFIELD', was {}".format(fieldtype)
+    optional_columns = _transformfield_columns \
+            if fieldtype == 'TRANSFORMFIELD' else _targetfield_columns
+    unknown = set(columns) - set(optional_columns)
+    assert not unknown, 'Unknown columns: {}'.format(sorted(unknown))
+
+    names = list(map(_as_str, names))
+    n = len(names)
+    assert datatypes is not None, 'datatypes must be given'
+    datatypes = list(map(_as_str, datatypes))
+    precisions = [''] * n if precisions is None else list(map(_as_str, precisions))
+    scales = [''] * n if scales is None else list(map(_as_str, scales))
+    columns = {keyword: list(map(_as_str, column)) for keyword, column in columns.items()}
+    for column_name, column in [('datatypes', datatypes), ('precisions', precisions),
+                                ('scales', scales)] + list(columns.items()):
+        assert len(column) == n, \
+                'All columns must have the same length; {} has length {}, expected {}'.format(column_name, len(column), n)
+
+    # Validate every row before anything is created
+    if fieldtype == 'TRANSFORMFIELD':
+        porttype = porttype.upper()
+        assert porttype in _porttype_groups, \
+                r"porttype must be either 'input', 'output', 'input/output' or 'local variable', was {}".format(porttype)
+        invalid = sorted(set(datatypes) - _allowed_datatypes)
+        assert not invalid, 'Datatype must be in {}; found {}'.format(sorted(_allowed_datatypes), invalid)
+    for i, (precision, scale) in enumerate(zip(precisions, scales)):
+        assert not precision or precision.isdigit(), \
+                'Precision must be a positive integer; was {} in row {}'.format(precision, i)
+        assert not scale or scale.isdigit(), \
+                'Scale must be a positive integer; was {} in row {}'.format(scale, i)
+
+    if 'description' in columns:
+        columns['description'] = [_whitespace.sub(' ', d).strip()
+                                   for d in columns['description']]
+
+    attributes = {}
+    for keyword, (attribute, default) in optional_columns.items():
+        if keyword in columns:
+            attributes[attribute] = columns[keyword]
+        else:
+            if default is None:
+                default = _porttype_groups[porttype]
+            attributes[attribute] = [default] * n
+    attributes['NAME'] = names
+    attributes['DATATYPE'] = datatypes
+
+    if fieldtype == 'TARGETFIELD':
+        attributes['PRECISION'] = precisions
+        attributes['SCALE'] = scales
+        attribute_names = _targetfield_names
+    else:
+        specs = [_datatype_specs[datatype] for datatype in datatypes]
+        attributes['PRECISION'] = [
+            spec[0] or precision or spec[1]
+            for spec, precision in zip(specs, precisions)]
+        attributes['SCALE'] = [
+            spec[2] or scale or spec[3]
+            for spec, scale in zip(specs, scales)]
+        attributes['PORTTYPE'] = [porttype] * n
+        if porttype in ('INPUT', 'INPUT/OUTPUT'):
+            attributes['EXPRESSION'] = names
+        attribute_names = _transformfield_names
+
+    layout = _layout(attribute_names)
+    rows = zip(*[attributes[attribute] for attribute in attribute_names])
+    return [Field.from_values(fieldtype, layout, row) for row in rows]
+
 
 def mvar(name, datatype,
         aggfunction='',
@@ -214,56 +615,30 @@ def mvar(name, datatype,
 
     assert isinstance(name, str), 'Expected str; was {}'.format(type(name))
     assert isinstance(datatype, str), 'Expected str; was {}'.format(type(datatype))
-    allowed_datatypes = ['bigint', 'binary', 'date/time', 'decimal', 'double',
-                        'integer', 'nstring', 'ntext', 'real', 'small integer',
-                        'string', 'text']
-    assert datatype in allowed_datatypes, 'Datatype must be in {}'.format(allowed_datatypes)
+    spec = _datatype_specs.get(datatype)
+    assert spec is not None, 'Datatype must be in {}'.format(list(_datatype_specs))
     assert isinstance(precision, str), 'Expected str; was {}'.format(type(precision))
     assert isinstance(scale, str), 'Expected str; was {}'.format(type(scale))
     assert not precision or precision.isdigit(), 'Precision must be a positive integer'
     assert not scale or scale.isdigit(), 'Scale must be a positive integer'
-                
-    precision_is_static = datatype in static_precision_dict
-    precision_is_variable = datatype in variable_precision_default_dict
-    scale_is_static = datatype in static_scale_dict
-    scale_is_variable = datatype in variable_scale_default_dict
-    
-    if precision_is_static:
-        precision = static_precision_dict[datatype]
-    else:
-        if not precision:
-            precision = variable_precision_default_dict[datatype]
-    if scale_is_static:
-        scale = static_scale_dict[datatype]
-    else:
-        if not scale:
-            scale = variable_scale_default_dict[datatype]
-    
+
+    static_precision, default_precision, static_scale, default_scale = spec
+    precision = static_precision or precision or default_precision
+    scale = static_scale or scale or default_scale
+
     if aggfunction:
         is_param = 'NO'
     else:
         is_param = 'YES'
 
     # Strip unnecessary whitespace from descriptions
-    description = re.sub('\s+', ' ', description).strip()
-
-
-
-
-    mvar = ('MAPPINGVARIABLE', {
-            'NAME': name,
-            'DATATYPE': datatype,
-            'DEFAULTVALUE': default_value,
-            'DESCRIPTION': description,
-            'ISEXPRESSIONVARIABLE': is_expressionvariable, 
-            'ISPARAM': is_param,
-            'PRECISION': precision,
-            'SCALE': scale,
-            'USERDEFINED': userdefined
-            })
+    if description:
+        description = _whitespace.sub(' ', description).strip()
 
+    values = [name, datatype, default_value, description,
+              is_expressionvariable, is_param, precision, scale, userdefined]
     if not aggfunction:
-        return mvar
+        return Field.from_values('MAPPINGVARIABLE', _mvar_layout, values)
     else:
-        mvar[1]['AGGFUNCTION'] = aggfunction
-        return mvar
+        return Field.from_values('MAPPINGVARIABLE', _mvar_aggfunction_layout,
+                                 values + [aggfunction])
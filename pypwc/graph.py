@@ -0,0 +1,146 @@
+'''
+A module for querying the connectors of a Composite as a graph, both
+between ports and between instances.
+'''
+from collections import deque
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+class ConnectorGraph(object):
+    '''
+    A view of the connectors of a Composite as a directed graph.
+
+    Ports are (instance name, field name)-tuples and instances are
+    referred to by name, as in the connectors themselves. The graph
+    reads the indexes kept by the composite, so it always reflects the
+    current connectors, and costs nothing to create.
+
+    >>> graph = mapping.graph
+    ... graph.upstream('T_OUT', 'ID')
+    [('AGG_a', 'g1'), ('RTR_r', 'f11'), ...]
+    '''
+    def __init__(self, composite):
+        self.composite = composite
+
+    ## Begin ports section
+    def ports_feeding(self, instance, field):
+        '''The ports connected directly to the port (instance, field).'''
+        return [(c['FROMINSTANCE'], c['FROMFIELD']) for c in
+                self.composite._connections_to.get((instance, field), {}).values()]
+
+    def ports_fed_by(self, instance, field):
+        '''The ports connected directly from the port (instance, field).'''
+        return [(c['TOINSTANCE'], c['TOFIELD']) for c in
+                self.composite._connections_from.get((instance, field), {}).values()]
+
+    def _walk(self, start, step):
+        # Breadth first, so only what is in the answer is visited
+        seen = {start}
+        found = []
+        queue = deque([start])
+        while queue:
+            for node in step(queue.popleft()):
+                if node not in seen:
+                    seen.add(node)
+                    found.append(node)
+                    queue.append(node)
+        return found
+
+    def upstream(self, instance, field=None):
+        '''
+        Returns everything that feeds instance, nearest first.
+
+        If field is given, the ports are returned. Lineage continues
+        through ports of the same name, i.e. INPUT/OUTPUT ports, since
+        only those have connectors both into and out of them. Otherwise
+        the names of all instances upstream of instance are returned.
+        '''
+        if field is None:
+            return self._walk(instance, self.parents)
+        return self._walk((instance, field),
+                          lambda port: self.ports_feeding(*port))
+
+    def downstream(self, instance, field=None):
+        '''
+        Returns everything fed by instance, nearest first. See upstream().
+        '''
+        if field is None:
+            return self._walk(instance, self.children)
+        return self._walk((instance, field),
+                          lambda port: self.ports_fed_by(*port))
+    ## End ports section
+
+    ## Begin instances section
+    def parents(self, instance):
+        '''The names of the instances connected directly to instance.'''
+        return list(self.composite._instance_parents.get(instance, ()))
+
+    def children(self, instance):
+        '''The names of the instances connected directly from instance.'''
+        return list(self.composite._instance_children.get(instance, ()))
+
+    @property
+    def instances(self):
+        '''The names of the components, followed by any other instance
+        names used in the connectors.'''
+        names = dict.fromkeys(self.composite.component_list_names)
+        for edges in (self.composite._instance_children,
+                      self.composite._instance_parents):
+            names.update(dict.fromkeys(edges))
+        return list(names)
+
+    def _sort(self):
+        '''Returns (sorted instances, instances left in cycles).'''
+        instances = self.instances
+        children = self.composite._instance_children
+        in_degree = {name: len(self.composite._instance_parents.get(name, ()))
+                     for name in instances}
+        queue = deque(name for name in instances if not in_degree[name])
+        order = []
+        while queue:
+            name = queue.popleft()
+            order.append(name)
+            for child in children.get(name, ()):
+                in_degree[child] -= 1
+                if not in_degree[child]:
+                    queue.append(child)
+        return order, [name for name in instances if in_degree[name]]
+
+    def topological_order(self):
+        '''
+        Returns the names of all instances, with every instance after the
+        instances connected to it. Ties keep the order of component_list.
+
+        Raises a ValueError if the connectors contain a cycle.
+        '''
+        order, remaining = self._sort()
+        if remaining:
+            raise ValueError('The connectors contain a cycle: {}'.format(
+                ' -> '.join(self.find_cycle())))
+        return order
+
+    def find_cycle(self):
+        '''Returns the names of the instances in a cycle, starting and
+        ending with the same instance, or None if there are no cycles.'''
+        _, remaining = self._sort()
+        if not remaining:
+            return None
+        # Every instance left by the sort is in, or downstream of, a
+        # cycle, and has a parent that was left as well. Walking parents
+        # from any of them must therefore end up in a cycle.
+        name = remaining[0]
+        remaining = set(remaining)
+        path = []
+        position = {}
+        while name not in position:
+            position[name] = len(path)
+            path.append(name)
+            name = next(parent for parent in self.parents(name)
+                        if parent in remaining)
+        cycle = path[position[name]:] + [name]
+        return cycle[::-1]
+
+    def has_cycle(self):
+        return bool(self._sort()[1])
+    ## End instances section
@@ -0,0 +1,189 @@
+'''
+A module for tracing the lineage of ports in Mappings and Mapplets,
+back through connectors, expressions, router groups and mapplets.
+'''
+from collections import namedtuple
+import re
+
+from .Canvas import Mapplet, MappletIO
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+# sources: a frozenset of the (instance, field)-ports where the lineage
+#     ends, i.e. SOURCEFIELDs, and ports without anything upstream, such
+#     as sequence outputs or unconnected inputs
+# expressions: (instance, field, expression)-tuples of the expressions
+#     the value passes through, nearest first
+PortLineage = namedtuple('PortLineage', ['sources', 'expressions'])
+
+_string_literal = re.compile(r"'[^']*'")
+_identifier = re.compile(r'[A-Za-z_$][A-Za-z0-9_$#]*')
+
+# Ports are visited as (instance, field, side), where side is 'in' for the
+# value arriving at the port through a connector, and 'out' for the value
+# leaving it.
+IN, OUT = 'in', 'out'
+
+
+class Lineage(object):
+    '''
+    Traces ports in composite back to where their values come from.
+
+    Every port is resolved at most once, and the results are shared, so
+    asking for the lineage of every target field costs a single walk of
+    the mapping. Create a new Lineage after changing the composite.
+
+    Instances inside a mapplet are reported as '<mapplet>.<instance>'.
+
+    >>> lineage = Lineage(mapping)
+    ... lineage.of('T_OUT', 'ID').sources
+    frozenset({('SQ_CUSTOMER', 'CUSTOMER_ID')})
+    '''
+    def __init__(self, composite):
+        self.composite = composite
+        self._memo = {}
+        self._mapplets = {}
+
+    def of(self, instance, field):
+        '''Returns the PortLineage of the value leaving the port field of
+        instance, or arriving at it, if it is an input port.'''
+        return self._resolve((instance, field, OUT))
+
+    def of_instance(self, instance):
+        '''Returns {field name: PortLineage} for every field of instance,
+        e.g. of every TARGETFIELD of a target.'''
+        component = self.composite.get_component_by_name(instance)
+        return {field[1]['NAME']: self.of(instance, field[1]['NAME'])
+                for field in component.fields if 'NAME' in field[1]}
+
+    def _resolve(self, start):
+        memo = self._memo
+        if start in memo:
+            return memo[start]
+
+        # An iterative post-order walk, so that long chains of instances
+        # do not hit the recursion limit
+        steps = {}
+        stack = [start]
+        while stack:
+            node = stack[-1]
+            if node in memo:
+                stack.pop()
+                continue
+            if node not in steps:
+                steps[node] = self._step(node)
+                pending = [up for up in steps[node][0]
+                           if up not in memo and up not in steps]
+                if pending:
+                    stack.extend(pending)
+                    continue
+            # Everything upstream is resolved, except nodes that are
+            # still being resolved further down the stack, i.e. cycles
+            upstream, sources, expressions = steps.pop(node)
+            sources = set(sources)
+            expressions = dict.fromkeys(expressions)
+            for up in upstream:
+                if up in memo:
+                    sources.update(memo[up].sources)
+                    expressions.update(dict.fromkeys(memo[up].expressions))
+            memo[node] = PortLineage(frozenset(sources), tuple(expressions))
+            stack.pop()
+        return memo[start]
+
+    def _step(self, node):
+        '''Returns (upstream nodes, sources, expressions) of node itself.'''
+        instance, field_name, side = node
+        if side == IN:
+            connections = self.composite._connections_to.get((instance, field_name), {})
+            if not connections:
+                return (), ((instance, field_name),), ()
+            return [(c['FROMINSTANCE'], c['FROMFIELD'], OUT)
+                    for c in connections.values()], (), ()
+
+        component = self.composite.get_component_by_name(instance)
+        if component is None or component.component_type == 'SOURCE':
+            return (), ((instance, field_name),), ()
+        if isinstance(component, Mapplet):
+            return self._step_through_mapplet(component, field_name)
+        if isinstance(component, MappletIO) and component.io_type == 'input':
+            # The inputs of a mapplet are resolved by the composite using it
+            return (), ((instance, field_name),), ()
+
+        fields = component._fields_by_name
+        field = fields.get('TRANSFORMFIELD', {}).get(field_name)
+        if field is None:
+            field = fields.get('TARGETFIELD', {}).get(field_name)
+            if field is not None:
+                return [(instance, field_name, IN)], (), ()
+            reference = self._router_reference(component, field_name)
+            if reference is None:
+                return (), ((instance, field_name),), ()
+            return [(instance, reference, IN)], (), ()
+
+        att = field[1]
+        if att.get('REF_FIELD') and att.get('REF_FIELD') != field_name:
+            return [(instance, att['REF_FIELD'], IN)], (), ()
+        if 'INPUT' in att.get('PORTTYPE', ''):
+            return [(instance, field_name, IN)], (), ()
+
+        expression = att.get('EXPRESSION', '')
+        upstream = []
+        for name in self._port_names(component, expression):
+            other = component.get_field_by_name(name)
+            if 'INPUT' in other[1].get('PORTTYPE', ''):
+                upstream.append((instance, name, IN))
+            else:
+                upstream.append((instance, name, OUT))
+        if not upstream:
+            return (), ((instance, field_name),), ()
+        return upstream, (), ((instance, field_name, expression),)
+
+    def _port_names(self, component, expression):
+        '''The names of the other ports of component that are referred
+        to in expression. PowerCenter port names are case insensitive.'''
+        if not expression:
+            return []
+        names = {}
+        for name in component._fields_by_name.get('TRANSFORMFIELD', {}):
+            names.setdefault(name.upper(), name)
+        found = {}
+        for identifier in _identifier.findall(_string_literal.sub('', expression)):
+            name = names.get(identifier.upper())
+            if name is not None:
+                found[name] = None
+        return list(found)
+
+    def _router_reference(self, component, field_name):
+        '''The input port of a Router that the group port field_name, e.g.
+        NAME1 of the group with index 1, was made from.'''
+        for group_name in getattr(component, 'groups', {}):
+            reference = component.group(group_name).reference(field_name)
+            if reference is not None:
+                return reference
+        return None
+
+    def _step_through_mapplet(self, mapplet, field_name):
+        instance = mapplet.name
+        inner = self._mapplets.get(id(mapplet))
+        if inner is None:
+            inner = self._mapplets[id(mapplet)] = Lineage(mapplet)
+
+        for output in mapplet.output.values():
+            if output.has_field(field_name):
+                inner_lineage = inner._resolve((output.name, field_name, IN))
+                break
+        else:
+            return (), ((instance, field_name),), ()
+
+        inputs = {mapplet_input.name for mapplet_input in mapplet.input.values()}
+        upstream = []
+        sources = []
+        for inner_instance, inner_field in inner_lineage.sources:
+            if inner_instance in inputs:
+                upstream.append((instance, inner_field, IN))
+            else:
+                sources.append(('{}.{}'.format(instance, inner_instance), inner_field))
+        expressions = [('{}.{}'.format(instance, inner_instance), inner_field, expression)
+                       for inner_instance, inner_field, expression in inner_lineage.expressions]
+        return upstream, sources, expressions
@@ -0,0 +1,177 @@
+'''
+A module for keeping track of the files written to an output directory,
+so that files whose content has not changed are not written again.
+'''
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import os
+import threading
+
+from . import writer
+
+try:
+    import fcntl
+except ImportError:
+    # E.g. on Windows, where only the threads of a process are kept from
+    # saving the same manifest at the same time
+    fcntl = None
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+class Manifest(object):
+    '''
+    The manifest of an output directory. For every file written, it
+    holds the fingerprint of the composite written to it, the encoding,
+    and the size and modification time of the file.
+
+    A file is only current if all of these still match, so files that
+    have been deleted or edited by hand are written again.
+
+    save() merges the files recorded since the last save into the
+    manifest on disk, under a lock (the file filename + '.lock' next to
+    it), so that writers in other threads and processes do not lose each
+    others entries. Within a batch(), saves are put off until the end
+    of the batch.
+    '''
+    filename = '.pypwc-manifest.json'
+    _version = 1
+    # directory: (manifest stat, Manifest), so that writing many files
+    # to the same directory does not read the manifest for every file
+    _loaded = {}
+    # The manifests whose saves are put off by batch(), if any
+    _batch = ContextVar('pypwc_manifest_batch', default=None)
+    # directory: lock, serializing the saves of the threads of this process
+    _locks = {}
+    _locks_lock = threading.Lock()
+
+    def __init__(self, directory):
+        self.directory = os.path.abspath(directory)
+        self.path = os.path.join(self.directory, Manifest.filename)
+        self.entries = self._read()
+        # The entries recorded since the last save
+        self._changed = {}
+
+    def _read(self):
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                content = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        if isinstance(content, dict) and content.get('version') == Manifest._version:
+            return content.get('files', {})
+        return {}
+
+    @classmethod
+    def for_file(cls, path):
+        '''Returns the manifest of the directory containing path.'''
+        directory = os.path.dirname(os.path.abspath(path))
+        loaded = cls._loaded.get(directory)
+        if loaded is not None and loaded[0] == cls._stat(loaded[1].path):
+            return loaded[1]
+        manifest = cls(directory)
+        cls._loaded[directory] = (cls._stat(manifest.path), manifest)
+        return manifest
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def _key(self, path):
+        return os.path.relpath(os.path.abspath(path), self.directory)
+
+    def is_current(self, path, fingerprint, encoding):
+        '''True if path was written from a composite with fingerprint,
+        and has not been changed since.'''
+        entry = self.entries.get(self._key(path))
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return (entry.get('fingerprint') == fingerprint
+                and entry.get('encoding') == encoding
+                and entry.get('size') == stat.st_size
+                and entry.get('mtime_ns') == stat.st_mtime_ns)
+
+    def record(self, path, fingerprint, encoding):
+        '''Records that path has just been written.'''
+        stat = os.stat(path)
+        key = self._key(path)
+        self.entries[key] = self._changed[key] = {
+            'fingerprint': fingerprint,
+            'encoding': encoding,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+        }
+
+    @classmethod
+    @contextmanager
+    def batch(cls):
+        '''
+        Puts off saving manifests until the end of the block, so that
+        writing many files to a directory only saves its manifest once,
+        e.g.
+
+            with Manifest.batch():
+                for mapping in mappings:
+                    mapping.write(os.path.join(out_dir, mapping.name + '.xml'))
+        '''
+        if cls._batch.get() is not None:
+            yield
+            return
+        pending = {}
+        token = cls._batch.set(pending)
+        try:
+            yield
+        finally:
+            cls._batch.reset(token)
+            for manifest in pending.values():
+                manifest.save()
+
+    @contextmanager
+    def _locked(self):
+        with Manifest._locks_lock:
+            lock = Manifest._locks.setdefault(self.directory, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + '.lock', 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self):
+        '''Merges the files recorded since the last save into the manifest
+        on disk. Within a batch(), this happens at the end of the batch.'''
+        pending = Manifest._batch.get()
+        if pending is not None:
+            pending[id(self)] = self
+            return
+        if not self._changed:
+            return
+        with self._locked():
+            entries = self._read()
+            entries.update(self._changed)
+            fd, tmp_path = writer.mkstemp(prefix='.{}.'.format(Manifest.filename),
+                                          suffix='.tmp', dir=self.directory)
+            try:
+                with open(fd, mode='w', encoding='utf-8') as file:
+                    json.dump({'version': Manifest._version, 'files': entries},
+                              file, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self.entries = entries
+            self._changed = {}
+            Manifest._loaded[self.directory] = (Manifest._stat(self.path), self)
@@ -0,0 +1,466 @@
+'''
+A module for looking up table and query metadata in the databases that
+mappings are generated from, with pooled connections and a cache of
+the results.
+'''
+from abc import ABCMeta, abstractmethod
+import asyncio
+from collections import namedtuple, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import datetime
+import decimal
+import re
+import sqlite3
+import threading
+import time
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+# data: the rows returned by the query
+# column_names: the names of the columns
+# descriptions: a DB-API description, i.e. a (name, type_code,
+#     display_size, internal_size, precision, scale, null_ok)-tuple, of
+#     every column
+QueryResult = namedtuple('QueryResult', ['data', 'column_names', 'descriptions'])
+
+# A column of a table, as found in the catalog of the database, where
+# datatype is the Netezza datatype, e.g. 'nvarchar', precision and scale
+# are ints, position counts from 1 and nullable and primary_key are bools
+CatalogColumn = namedtuple('CatalogColumn', [
+    'table', 'name', 'datatype', 'precision', 'scale', 'nullable',
+    'position', 'primary_key'
+])
+
+# The declared types of columns, as Netezza formats them, as
+# type: (datatype, default precision, default scale). Character types
+# are all nvarchar, as in utils.get_nz_datatype_from_description().
+_netezza_types = {
+    'BIGINT': ('bigint', 19, 0),
+    'INT8': ('bigint', 19, 0),
+    'INTEGER': ('integer', 10, 0),
+    'INT': ('integer', 10, 0),
+    'INT4': ('integer', 10, 0),
+    'BYTEINT': ('byteint', 3, 0),
+    'INT1': ('byteint', 3, 0),
+    'NUMERIC': ('numeric', 18, 0),
+    'DECIMAL': ('numeric', 18, 0),
+    'NATIONAL CHARACTER VARYING': ('nvarchar', 50, 0),
+    'NVARCHAR': ('nvarchar', 50, 0),
+    'CHARACTER VARYING': ('nvarchar', 50, 0),
+    'VARCHAR': ('nvarchar', 50, 0),
+    'NATIONAL CHARACTER': ('nvarchar', 50, 0),
+    'NCHAR': ('nvarchar', 50, 0),
+    'CHARACTER': ('nvarchar', 50, 0),
+    'CHAR': ('nvarchar', 50, 0),
+    'TEXT': ('nvarchar', 50, 0),
+    'TIMESTAMP': ('timestamp', 26, 6),
+    'DATETIME': ('timestamp', 26, 6),
+}
+_declared_type = re.compile(r'\s*([A-Za-z0-9 ]*?)\s*(?:\(\s*(\d+)\s*(?:,\s*(\d+)\s*)?\))?\s*$')
+
+def _parse_type(declared_type):
+    '''Returns (datatype, precision, scale) of a declared type, e.g.
+    ('numeric', 18, 2) of 'NUMERIC(18,2)'. Types that are not known are
+    returned in lower case, with their precision and scale, if any.'''
+    type_name, precision, scale = _declared_type.match(declared_type or '').groups()
+    datatype, default_precision, default_scale = _netezza_types.get(
+        type_name.upper(), (type_name.lower(), 0, 0))
+    if precision and datatype in ('numeric', 'nvarchar') or datatype not in _datatypes:
+        return (datatype, int(precision or 0), int(scale or 0))
+    return (datatype, default_precision, default_scale)
+
+_datatypes = {datatype for datatype, _, _ in _netezza_types.values()}
+
+def _quote(value):
+    return "'{}'".format(value.replace("'", "''"))
+
+
+class Backend(object, metaclass=ABCMeta):
+    '''
+    A kind of database. A Backend knows how to open a connection to the
+    database of an environment, e.g. 'MDW', and how to run a query on it.
+    '''
+    @abstractmethod
+    def connect(self, env):
+        '''Returns a new connection to the database of env.'''
+
+    @abstractmethod
+    def query(self, connection, sql):
+        '''Runs sql on connection, and returns a QueryResult.'''
+
+    @abstractmethod
+    def catalog(self, connection, tables):
+        '''Returns the CatalogColumns of tables, a list of table names,
+        ordered by table and position, in a single query.'''
+
+    def close(self, connection):
+        connection.close()
+
+
+class NetezzaBackend(Backend):
+    '''The Netezza databases, through DatabaseConnection.'''
+    def __init__(self, host='NZDEV.RES.BEC.DK', database='DEV_{}'):
+        self.host = host
+        # DEV because tables are always in DEV
+        self.database = database
+
+    def connect(self, env):
+        # Only needed when the Netezza databases are used
+        import DatabaseConnection as dbc
+        connection = dbc.DatabaseConnection(host=self.host,
+                                            database=self.database.format(env))
+        return connection.__enter__()
+
+    def query(self, connection, sql):
+        connection.sql = sql
+        data, column_names, descriptions = connection.sql_results
+        return QueryResult(data, column_names, descriptions)
+
+    def catalog(self, connection, tables):
+        # Netezza keeps names in upper case
+        names = {table.upper(): table for table in tables}
+        result = self.query(connection, '''
+            SELECT c.name, c.attname, c.format_type, c.attnotnull, c.attnum,
+                   CASE WHEN k.attname IS NULL THEN 0 ELSE 1 END
+            FROM _v_relation_column c
+            LEFT JOIN _v_relation_keydata k
+                ON k.relation = c.name AND k.attname = c.attname AND k.contype = 'p'
+            WHERE c.name IN ({})
+            ORDER BY c.name, c.attnum'''.format(', '.join(map(_quote, names))))
+        return [CatalogColumn(names.get(table.upper(), table), name,
+                              *_parse_type(format_type), not not_null,
+                              int(position), bool(primary_key))
+                for table, name, format_type, not_null, position, primary_key
+                in result.data]
+
+    def close(self, connection):
+        connection.__exit__(None, None, None)
+
+
+class SQLiteBackend(Backend):
+    '''
+    SQLite databases standing in for the real ones, e.g. in tests.
+
+    path is the path of the database file of each environment, with {}
+    in place of the environment, or ':memory:'. setup, if given, is run
+    as a script on every new connection, e.g. to create tables in an
+    in-memory database.
+
+    Since SQLite does not describe the columns of results, the columns
+    are described from their declared types, as Netezza would describe
+    them, so that SQLite tables declared with Netezza datatypes, e.g.
+    NVARCHAR(50) or NUMERIC(18,2), give the same fields. SQLite does not
+    keep NOT NULL constraints in the description of a query, so all
+    columns are described as nullable.
+    '''
+    # declared type: (type_code, internal_size)
+    _declared_types = {
+        'BIGINT': (int, 19),
+        'INT8': (int, 19),
+        'INTEGER': (int, 10),
+        'INT': (int, 10),
+        'INT4': (int, 10),
+        'BYTEINT': (int, 3),
+        'SMALLINT': (int, 3),
+        'NUMERIC': (decimal.Decimal, 6),
+        'DECIMAL': (decimal.Decimal, 6),
+        'NVARCHAR': (str, 50),
+        'VARCHAR': (str, 50),
+        'NCHAR': (str, 50),
+        'CHAR': (str, 50),
+        'TEXT': (str, 50),
+        'TIMESTAMP': (datetime.datetime, 26),
+        'DATETIME': (datetime.datetime, 26),
+    }
+
+    def __init__(self, path=':memory:', setup=None):
+        self.path = path
+        self.setup = setup
+
+    def connect(self, env):
+        # Connections are handed between threads by the pool, but only
+        # ever used by one thread at a time
+        connection = sqlite3.connect(self.path.format(env), check_same_thread=False)
+        if self.setup:
+            connection.executescript(self.setup)
+        return connection
+
+    def query(self, connection, sql):
+        cursor = connection.execute(sql)
+        data = cursor.fetchall()
+        column_names = [column[0] for column in cursor.description]
+        return QueryResult(data, column_names,
+                           self._describe(connection, sql, column_names))
+
+    def catalog(self, connection, tables):
+        rows = connection.execute('''
+            SELECT m.name, p.name, p.type, p."notnull", p.cid + 1, p.pk
+            FROM sqlite_master m JOIN pragma_table_info(m.name) p
+            WHERE m.type IN ('table', 'view') AND m.name IN ({})
+            ORDER BY m.name, p.cid'''.format(', '.join('?' * len(tables))),
+            list(tables)).fetchall()
+        return [CatalogColumn(table, name, *_parse_type(declared_type),
+                              not not_null, position, bool(primary_key))
+                for table, name, declared_type, not_null, position, primary_key
+                in rows]
+
+    def _describe(self, connection, sql, column_names):
+        # The declared types of the columns of a view are those of the
+        # columns it selects
+        view = '_pypwc_describe'
+        connection.execute('DROP VIEW IF EXISTS temp.{}'.format(view))
+        connection.execute('CREATE TEMP VIEW {} AS {}'.format(view, sql.strip().rstrip(';')))
+        try:
+            columns = connection.execute('PRAGMA table_info({})'.format(view)).fetchall()
+        finally:
+            connection.execute('DROP VIEW temp.{}'.format(view))
+        return [self._description(name, declared_type, not_null)
+                for name, (_, _, declared_type, not_null, _, _)
+                in zip(column_names, columns)]
+
+    def _description(self, name, declared_type, not_null):
+        type_name, precision, scale = _declared_type.match(declared_type).groups()
+        type_code, internal_size = self._declared_types.get(type_name.upper(), (str, 50))
+        if type_code is str:
+            precision = int(precision) if precision else internal_size
+            scale = 0
+        elif type_code is decimal.Decimal:
+            precision = int(precision) if precision else 18
+            scale = int(scale) if scale else 0
+        else:
+            precision = internal_size
+            scale = 6 if type_code is datetime.datetime else 0
+        return (name, type_code, precision, internal_size, precision, scale, not not_null)
+
+
+class ConnectionPool(object):
+    '''
+    Connections of a Backend, kept open for reuse, with at most maxsize
+    idle connections per environment. The pool may be shared between
+    threads; a connection is only used by one thread at a time.
+    '''
+    def __init__(self, backend, maxsize=4):
+        assert isinstance(maxsize, int) and maxsize >= 0, \
+                'maxsize must be a non-negative int; was {}'.format(maxsize)
+        self.backend = backend
+        self.maxsize = maxsize
+        # env: [idle connections]
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, env):
+        '''Lends a connection to the database of env for the duration of
+        the block. Connections that fail are closed, not reused.'''
+        with self._lock:
+            idle = self._idle.get(env)
+            connection = idle.pop() if idle else None
+        if connection is None:
+            connection = self.backend.connect(env)
+        try:
+            yield connection
+        except BaseException:
+            self.backend.close(connection)
+            raise
+        with self._lock:
+            idle = self._idle.setdefault(env, [])
+            if len(idle) < self.maxsize:
+                idle.append(connection)
+                connection = None
+        if connection is not None:
+            self.backend.close(connection)
+
+    def close(self):
+        '''Closes all idle connections.'''
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                self.backend.close(connection)
+
+
+class MetadataCache(object):
+    '''
+    A least recently used cache of at most maxsize items, where items
+    expire ttl seconds after they were added. A ttl of None never
+    expires items. The cache may be shared between threads.
+    '''
+    def __init__(self, maxsize=256, ttl=3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            expires, value = item
+            if expires is not None and expires <= time.monotonic():
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._items[key] = (expires, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        '''Removes the items whose key satisfies predicate, or all items.'''
+        with self._lock:
+            if predicate is None:
+                self._items.clear()
+            else:
+                for key in [key for key in self._items if predicate(key)]:
+                    del self._items[key]
+
+    def __len__(self):
+        return len(self._items)
+
+
+class MetadataProvider(object):
+    '''
+    Runs metadata queries, e.g. the queries of utils.target_from_sql(),
+    on pooled connections of backend, and caches the results by
+    (environment, sql).
+
+    The results are shared between callers, and must not be changed.
+
+    query_async() and catalog_async() run the queries in a pool of at
+    most concurrency threads, so that coroutines can wait for them
+    without blocking the event loop.
+
+    >>> provider = MetadataProvider(SQLiteBackend(setup='CREATE TABLE T (ID BIGINT)'))
+    >>> provider.query('SELECT * FROM T').column_names
+    ['ID']
+    '''
+    def __init__(self, backend=None, pool_size=4, cache_size=256, ttl=3600,
+                 concurrency=4):
+        self.backend = NetezzaBackend() if backend is None else backend
+        self.pool = ConnectionPool(self.backend, maxsize=pool_size)
+        self.cache = MetadataCache(maxsize=cache_size, ttl=ttl)
+        assert isinstance(concurrency, int) and concurrency > 0, \
+                'concurrency must be a positive int; was {}'.format(concurrency)
+        self.concurrency = concurrency
+        self._executor = None
+        # (env, sql): lock, so that a query missing from the cache is
+        # only run once, however many threads ask for it
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def query(self, sql, env='MDW'):
+        '''Returns the QueryResult of sql in the database of env.'''
+        key = (env, sql.strip())
+        result = self.cache.get(key)
+        if result is not None:
+            return result
+        with self._lock:
+            lock = self._pending.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                result = self.cache.get(key)
+                if result is None:
+                    with self.pool.connection(env) as connection:
+                        result = self.backend.query(connection, sql)
+                    self.cache.set(key, result)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        return result
+
+    def catalog(self, tables, env='MDW'):
+        '''
+        Returns {table: [CatalogColumns]} of tables in the database of env.
+        The columns of all tables that are not cached are found in a
+        single query, and cached per table. Tables that do not exist are
+        left out.
+        '''
+        tables = list(dict.fromkeys(tables))
+        columns = {}
+        missing = []
+        for table in tables:
+            cached = self.cache.get((env, ('catalog', table)))
+            if cached is None:
+                missing.append(table)
+            else:
+                columns[table] = cached
+        if missing:
+            with self.pool.connection(env) as connection:
+                found = self.backend.catalog(connection, missing)
+            for column in found:
+                columns.setdefault(column.table, []).append(column)
+            for table in missing:
+                if table in columns:
+                    self.cache.set((env, ('catalog', table)), columns[table])
+        return {table: columns[table] for table in tables if table in columns}
+
+    def _run_async(self, function, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.concurrency, thread_name_prefix='pypwc-metadata')
+            executor = self._executor
+        return asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+    async def query_async(self, sql, env='MDW'):
+        '''As query(), but awaitable. Cached results are returned at once.'''
+        result = self.cache.get((env, sql.strip()))
+        if result is not None:
+            return result
+        return await self._run_async(self.query, sql, env)
+
+    async def catalog_async(self, tables, env='MDW'):
+        '''As catalog(), but awaitable.'''
+        return await self._run_async(self.catalog, tables, env)
+
+    def invalidate(self, env=None, sql=None):
+        '''Forgets the cached results of sql and/or env, or of everything.'''
+        if env is None and sql is None:
+            self.cache.invalidate()
+        else:
+            self.cache.invalidate(lambda key: (env is None or key[0] == env)
+                                  and (sql is None or key[1] == sql.strip()))
+
+    def close(self):
+        '''Closes the pooled connections, and stops the threads of
+        query_async() and catalog_async().'''
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+def default_provider():
+    '''Returns the MetadataProvider used when no provider is given, a
+    provider of the Netezza databases unless set by set_default_provider().'''
+    global _default_provider
+    with _default_provider_lock:
+        if _default_provider is None:
+            _default_provider = MetadataProvider()
+        return _default_provider
+
+def set_default_provider(provider):
+    '''Makes provider the default MetadataProvider, and returns the
+    previous one, e.g. to use an SQLiteBackend in tests.'''
+    global _default_provider
+    with _default_provider_lock:
+        previous, _default_provider = _default_provider, provider
+    return previous
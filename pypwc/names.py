@@ -0,0 +1,122 @@
+'''
+A module for keeping track of the names given to Components.
+'''
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+class NameRegistry(object):
+    '''
+    A set of names, with unique names made on request.
+
+    If maxsize is given, the registry never holds more than maxsize
+    names, nor more than maxsize of the counters used by unique(); the
+    names registered first are forgotten first. The registry may be
+    shared between threads.
+
+    >>> registry = NameRegistry()
+    >>> registry.register('EXP_a')
+    'EXP_a'
+    >>> registry.unique('EXP_a')
+    'EXP_a1'
+    '''
+    def __init__(self, maxsize=None):
+        assert maxsize is None or (isinstance(maxsize, int) and maxsize > 0), \
+                'maxsize must be None or a positive int; was {}'.format(maxsize)
+        self.maxsize = maxsize
+        self._names = OrderedDict()
+        # prefix: the next number to try in unique(). Forgetting a
+        # counter only means that unique() starts over from 1.
+        self._counters = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._names))
+
+    def _add(self, name):
+        names = self._names
+        names[name] = None
+        names.move_to_end(name)
+        if self.maxsize is not None and len(names) > self.maxsize:
+            names.popitem(last=False)
+
+    def _set_counter(self, prefix, number):
+        counters = self._counters
+        counters[prefix] = number
+        counters.move_to_end(prefix)
+        if self.maxsize is not None and len(counters) > self.maxsize:
+            counters.popitem(last=False)
+
+    def register(self, name):
+        '''Adds name to the registry, and returns it.'''
+        with self._lock:
+            self._add(name)
+        return name
+
+    def unique(self, prefix):
+        '''Returns a name starting with prefix that is not in the
+        registry, i.e. prefix itself or prefix followed by a number,
+        and adds it to the registry.'''
+        with self._lock:
+            name = prefix
+            number = self._counters.get(prefix, 1)
+            while name in self._names:
+                name = '{}{}'.format(prefix, number)
+                number += 1
+            self._set_counter(prefix, number)
+            self._add(name)
+        return name
+
+    def release(self, name):
+        '''Removes name from the registry, if it is there.'''
+        with self._lock:
+            self._names.pop(name, None)
+
+    def reset(self):
+        '''Forgets all names.'''
+        with self._lock:
+            self._names.clear()
+            self._counters.clear()
+
+
+# Names are registered in the registry of the current context, which is
+# the bounded default registry, unless set by name_scope(). Threads and
+# asyncio tasks each get their own context.
+_default_registry = NameRegistry(maxsize=100000)
+_current_registry = ContextVar('pypwc_name_registry', default=_default_registry)
+
+def current_registry():
+    '''Returns the NameRegistry that Components register their names in.'''
+    return _current_registry.get()
+
+@contextmanager
+def name_scope(registry=None):
+    '''
+    Registers the names of Components created within the block in
+    registry, or in a new NameRegistry, instead of the current one.
+    The names are dropped along with the registry afterwards.
+
+    >>> with name_scope() as registry:
+    ...     current_registry().register('EXP_scoped')
+    'EXP_scoped'
+    >>> 'EXP_scoped' in registry, 'EXP_scoped' in current_registry()
+    (True, False)
+    '''
+    if registry is None:
+        registry = NameRegistry()
+    token = _current_registry.set(registry)
+    try:
+        yield registry
+    finally:
+        _current_registry.reset(token)
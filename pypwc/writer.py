@@ -0,0 +1,97 @@
+'''
+A module for writing ElementTrees as indented POWERMART XML,
+one element at a time, directly to a file or stream.
+'''
+import io
+import os
+import tempfile
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+version_and_encoding = '<?xml version="1.0" encoding="Windows-1252"?>\n'
+doctype = '<!DOCTYPE POWERMART SYSTEM "powrmart.dtd">\n'
+
+_create_flags = os.O_RDWR | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+
+def mkstemp(prefix, suffix, dir):
+    '''
+    As tempfile.mkstemp(), except that the file is created with the
+    permissions of any other new file, i.e. 0o666 less the umask, since
+    tempfile.mkstemp() creates files readable only by the owner.
+    '''
+    for _ in range(tempfile.TMP_MAX):
+        path = os.path.join(dir, prefix + os.urandom(6).hex() + suffix)
+        try:
+            return os.open(path, _create_flags, 0o666), path
+        except FileExistsError:
+            continue
+    raise FileExistsError('No usable temporary file name found in {}'.format(dir))
+
+def _escape_attribute(value):
+    # Mirrors the escaping done by minidom, which was previously used
+    # to prettify the output.
+    return value.replace('&', '&amp;').replace('<', '&lt;') \
+                .replace('"', '&quot;').replace('>', '&gt;')
+
+def write_element(element, stream, indent='  ', level=0):
+    '''
+    Write element and all of its subelements to stream, with each
+    element on its own line, indented by level*indent.
+    '''
+    stream.write(indent*level + '<' + element.tag)
+    for name, value in element.attrib.items():
+        stream.write(' {}="{}"'.format(name, _escape_attribute(value)))
+
+    if len(element):
+        stream.write('>\n')
+        for subelement in element:
+            write_element(subelement, stream, indent=indent, level=level+1)
+        stream.write('{}</{}>\n'.format(indent*level, element.tag))
+    else:
+        stream.write('/>\n')
+
+def write_document(tree, stream, indent='  '):
+    '''
+    Write the ElementTree (or Element) tree to stream, prepended with
+    the xml version, encoding and doctype expected by PowerCenter.
+    '''
+    root = tree.getroot() if hasattr(tree, 'getroot') else tree
+    stream.write(version_and_encoding)
+    stream.write(doctype)
+    write_element(root, stream, indent=indent)
+
+def tostring(tree, indent='  '):
+    '''
+    Returns the prettified document as a str, without touching the
+    filesystem.
+    '''
+    stream = io.StringIO()
+    write_document(tree, stream, indent=indent)
+    return stream.getvalue()
+
+def write(tree, path_or_stream, encoding='utf-8'):
+    '''
+    Write tree to path_or_stream. If path_or_stream has a write()-method
+    it is written to directly, otherwise it is treated as a path.
+
+    Paths are written via a uniquely named temporary file in the same
+    directory, which is then atomically renamed to path. Concurrent
+    writers therefore never share temporary files, and readers never
+    see a partially written document.
+    '''
+    if hasattr(path_or_stream, 'write'):
+        write_document(tree, path_or_stream)
+        return
+
+    path = os.path.abspath(path_or_stream)
+    directory, filename = os.path.split(path)
+    fd, tmp_path = mkstemp(prefix='.{}.'.format(filename),
+                           suffix='.tmp', dir=directory)
+    try:
+        with open(fd, mode='w', encoding=encoding) as file:
+            write_document(tree, file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
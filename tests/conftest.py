@@ -0,0 +1,94 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+data = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# The repository is the package, under whatever name it is checked out as
+sys.path.insert(0, os.path.dirname(root))
+pwc = importlib.import_module(os.path.basename(root))
+
+from_xml = importlib.import_module(pwc.__name__ + '.from_xml')
+Canvas = pwc.pypwc.Canvas
+Transformations = pwc.pypwc.Transformations
+fields = pwc.pypwc.fields
+names = pwc.pypwc.names
+manifest = pwc.pypwc.manifest
+metadata = importlib.import_module(pwc.__name__ + '.pypwc.metadata')
+
+
+def build_mapping(n_exp=5, n_mplt=2):
+    '''Returns a Mapping with mapplets, a router, a sequence, an aggregator
+    and a target. data/mapping.xml is the output of build_mapping().'''
+    mapplets = []
+    for m in range(n_mplt):
+        exps = []
+        for e in range(n_exp):
+            x = Transformations.Expression(name='exp_{}_{}'.format(m, e), description='desc & <stuff> "q"')
+            x.add_fields([fields.iofield('f1', 'bigint'),
+                          fields.iofield('f2', 'nstring', precision='20', description='a  b\n c'),
+                          fields.iofield('f3', 'decimal', precision='10', scale='2')])
+            exps.append(x)
+        mplt = Canvas.Mapplet(name='mplt_{}'.format(m), component_list=exps)
+        mplt.input['input'] = Canvas.MappletIO(name='INPUT', io_type='input', parent_mapplet=mplt)
+        mplt.input['input'].add_fields([fields.ofield('f1', 'bigint'),
+                                        fields.ofield('f2', 'nstring', precision='20'),
+                                        fields.ofield('f3', 'decimal', precision='10', scale='2')])
+        mplt.output['output'] = Canvas.MappletIO(name='OUTPUT', io_type='output', parent_mapplet=mplt)
+        mplt.output['output'].add_fields([fields.ifield('f1', 'bigint'),
+                                          fields.ifield('f2', 'nstring', precision='20'),
+                                          fields.ifield('f3', 'decimal', precision='10', scale='2')])
+        mplt.connect_by_index(mplt.input['input'], exps[0])
+        for a, b in zip(exps, exps[1:]):
+            mplt.connect_by_name(a, b)
+        mplt.connect_by_index(exps[-1], mplt.output['output'])
+        mapplets.append(mplt)
+
+    m_ = Canvas.Mapping('m_test')
+    m_.creation_date = '01/01/2020 00:00:00'
+    src = Transformations.Expression(name='src')
+    src.add_fields([fields.ofield('f1', 'bigint'),
+                    fields.ofield('f2', 'nstring', precision='20'),
+                    fields.ofield('f3', 'decimal', precision='10', scale='2')])
+    m_.add_component(src)
+    prev = src
+    for mplt in mapplets:
+        m_.add_component(mplt)
+        m_.connect(prev, mplt.input['input'], {'f1': 'f1', 'f2': 'f2', 'f3': 'f3'})
+        prev = mplt.output['output']
+    rtr = Transformations.Router(name='r')
+    rtr.add_fields([fields.ifield('f1', 'bigint'), fields.ifield('f2', 'nstring', precision='20')])
+    rtr.groups['G1'] = ('', "f1 > 0", '1', 'OUTPUT')
+    m_.add_component(rtr)
+    m_.connect(prev, rtr, {'f1': 'f1', 'f2': 'f2'})
+    seq = Transformations.Sequence(name='s')
+    m_.add_component(seq)
+    agg = Transformations.Aggregator(name='a')
+    agg.add_fields([fields.ifield('g1', 'bigint'), fields.ifield('g2', 'nstring', precision='20'),
+                    fields.ofield('n', 'bigint'), fields.vfield('v', 'integer')])
+    m_.add_component(agg)
+    m_.connect(rtr.group('G1'), agg, {'f11': 'g1', 'f21': 'g2'})
+    trg = Transformations.Target(name='T_OUT')
+    trg.add_fields([fields.targetfield('ID', 'bigint', precision='19', scale='0', keytype='PRIMARY KEY'),
+                    fields.targetfield('N', 'bigint', precision='19', scale='0'),
+                    fields.targetfield('SEQ', 'bigint', precision='19', scale='0')])
+    trg.load_order = '0'
+    m_.add_component(trg)
+    m_.connect(agg, trg, {'g1': 'ID', 'n': 'N'})
+    m_.connect(seq, trg, {'NEXTVAL': 'SEQ'})
+    m_.mapping_variables.append(fields.mvar('$$V', 'integer', aggfunction='MAX'))
+    m_.mapping_variables.append(fields.mvar('$$W', 'nstring', precision='10'))
+    return m_
+
+
+@pytest.fixture
+def mapping():
+    # Every test gets the same names, however many mappings were built before
+    with names.name_scope():
+        yield build_mapping()
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from conftest import data, Canvas, Transformations, fields
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+golden = os.path.join(data, 'mapping.xml')
+
+
+def test_as_xml_is_unchanged(mapping, tmp_path):
+    with open(golden, 'rb') as f:
+        expected = f.read()
+    assert mapping.as_string().encode('utf-8') == expected
+    path = str(tmp_path / 'm_test.xml')
+    mapping.write(path)
+    with open(path, 'rb') as f:
+        assert f.read() == expected
+
+def test_lists_are_tuples(mapping):
+    assert isinstance(mapping.component_list, tuple)
+    assert isinstance(mapping.connection_list, tuple)
+    with pytest.raises(AttributeError):
+        mapping.component_list.append(Transformations.Expression(name='e'))
+    with pytest.raises(AttributeError):
+        mapping.connection_list.append(mapping.connection_list[0])
+
+def test_lists_cannot_be_assigned(mapping):
+    with pytest.raises(ValueError):
+        mapping.component_list = []
+    with pytest.raises(ValueError):
+        mapping.connection_list = []
+
+def test_lists_are_snapshots(mapping):
+    components, connections = mapping.component_list, mapping.connection_list
+    e = Transformations.Expression(name='e')
+    e.add_fields([fields.iofield('f1', 'bigint')])
+    mapping.add_component(e)
+    mapping.connect(components[0], e, {'f1': 'f1'})
+    assert len(mapping.component_list) == len(components) + 1
+    assert len(mapping.connection_list) == len(connections) + 1
+    assert e not in components
+
+def test_mapplet_component_list_follows_io(mapping):
+    mplt = mapping.get_component_by_name('mplt_0')
+    old_input = mplt.input['input']
+    assert old_input in mplt.component_list
+    mplt.input['input'] = Canvas.MappletIO(name='INPUT', io_type='input', parent_mapplet=mplt)
+    assert mplt.input['input'] in mplt.component_list
+    assert old_input not in mplt.component_list
@@ -0,0 +1,42 @@
+import doctest
+
+from conftest import fields
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+
+def test_doctests():
+    assert doctest.testmod(fields).failed == 0
+
+def test_field_behaves_like_a_tuple():
+    field = fields.iofield('F', 'decimal', precision='18', scale='4')
+    fieldtype, attributes = field
+    assert fieldtype == field[0] == 'TRANSFORMFIELD'
+    assert attributes['PRECISION'] == '18'
+    assert len(field) == 2
+    assert field == (fieldtype, dict(attributes))
+
+def test_setting_an_attribute_only_changes_that_field():
+    first = fields.ifield('A', 'bigint')
+    second = fields.ifield('A', 'bigint')
+    first[1]['NAME'] = 'B'
+    assert first[1]['NAME'] == 'B'
+    assert second[1]['NAME'] == 'A'
+    # The layout of attribute names is shared
+    assert first._layout is second._layout
+
+def test_replace():
+    field = fields.ifield('A', 'bigint')
+    replaced = field.replace(NAME='B', NEW='x')
+    assert field[1]['NAME'] == 'A' and 'NEW' not in field[1]
+    assert replaced[1]['NAME'] == 'B' and replaced[1]['NEW'] == 'x'
+
+def test_fields_from_columns_equals_one_at_a_time():
+    columns = fields.fields_from_columns(
+        ['A', 'B'], ['bigint', 'nstring'], precisions=[None, '20'],
+        description=['first', 'second'], porttype='input')
+    assert columns == [fields.ifield('A', 'bigint', description='first'),
+                       fields.ifield('B', 'nstring', precision='20', description='second')]
+    targets = fields.fields_from_columns(['A'], ['bigint'], fieldtype='TARGETFIELD')
+    assert targets == [fields.targetfield('A', 'bigint')]
@@ -0,0 +1,99 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import data, from_xml, fields
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+export = os.path.join(data, 'mapping.xml')
+
+shared_definitions = '''<?xml version="1.0" encoding="UTF-8"?>
+<POWERMART><REPOSITORY NAME="R"><FOLDER NAME="F">
+<SOURCE NAME="S"><SOURCEFIELD NAME="A" DATATYPE="bigint"/></SOURCE>
+<TARGET NAME="T"><TARGETFIELD NAME="A" DATATYPE="bigint"/></TARGET>
+<MAPPING NAME="m1">
+<INSTANCE NAME="S" TYPE="SOURCE" TRANSFORMATION_NAME="S" TRANSFORMATION_TYPE="Source Definition"/>
+<INSTANCE NAME="T" TYPE="TARGET" TRANSFORMATION_NAME="T" TRANSFORMATION_TYPE="Target Definition"/>
+<CONNECTOR FROMINSTANCE="S" FROMFIELD="A" TOINSTANCE="T" TOFIELD="A" FROMINSTANCETYPE="Source Definition" TOINSTANCETYPE="Target Definition"/>
+</MAPPING>
+<MAPPING NAME="m2">
+<INSTANCE NAME="S" TYPE="SOURCE" TRANSFORMATION_NAME="S" TRANSFORMATION_TYPE="Source Definition"/>
+<INSTANCE NAME="T" TYPE="TARGET" TRANSFORMATION_NAME="T" TRANSFORMATION_TYPE="Target Definition">
+<TABLEATTRIBUTE NAME="Truncate target table option" VALUE="YES"/>
+</INSTANCE>
+{connector}
+</MAPPING>
+</FOLDER></REPOSITORY></POWERMART>'''
+
+
+def _write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+def _renamed_mapplet_instance(tmp_path):
+    # The instance of mplt_0 in m_test is called mplt_inst
+    with open(export) as f:
+        lines = f.read().split('\n')
+    start = next(i for i, line in enumerate(lines) if '<INSTANCE' in line)
+    body = '\n'.join(lines[start:]).replace('NAME="mplt_0" REUSABLE', 'NAME="mplt_inst" REUSABLE') \
+                                   .replace('INSTANCE="mplt_0"', 'INSTANCE="mplt_inst"')
+    return _write(tmp_path, 'renamed.xml', '\n'.join(lines[:start] + [body]))
+
+
+def test_round_trip_is_byte_identical():
+    mapping = from_xml.from_xml(export)['MDW_KRE'].mappings['m_test']
+    mapping.creation_date = '01/01/2020 00:00:00'
+    with open(export) as f:
+        assert mapping.as_string() == f.read()
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_renamed_mapplet_instance(tmp_path, lazy):
+    path = _renamed_mapplet_instance(tmp_path)
+    if lazy:
+        with from_xml.LazyExport(path, cache=False) as export_:
+            mapping = export_['MDW_KRE'].mappings['m_test']
+    else:
+        mapping = from_xml.from_xml(path)['MDW_KRE'].mappings['m_test']
+
+    instance = mapping.get_component_by_name('mplt_inst')
+    assert instance is not None
+    assert mapping.get_component_by_name('mplt_0') is None
+    assert instance.attributes['NAME'] == 'mplt_inst'
+    assert [c.name for c in instance.parents] == ['EXP_src']
+    assert [c.name for c in instance.children] == ['mplt_1']
+    assert 'NAME="mplt_inst"' in mapping.as_string()
+
+def test_instances_do_not_share_definitions(tmp_path):
+    path = _write(tmp_path, 'shared.xml', shared_definitions.format(connector=''))
+    folder = from_xml.from_xml(path)['F']
+    m1, m2 = folder.mappings['m1'], folder.mappings['m2']
+
+    assert m1.get_component_by_name('T').table_attributes == {}
+    assert m2.get_component_by_name('T').table_attributes == {
+        'Truncate target table option': 'YES'}
+    assert [c.name for c in m1.get_component_by_name('S').children] == ['T']
+    assert m2.get_component_by_name('S').children == []
+
+    m1.get_component_by_name('T').add_field(fields.targetfield('B', 'bigint'))
+    assert len(m2.get_component_by_name('T').fields) == 1
+    assert len(folder.targets['T'].fields) == 1
+
+def test_connector_to_unknown_instance_raises(tmp_path):
+    connector = ('<CONNECTOR FROMINSTANCE="S" FROMFIELD="A" TOINSTANCE="X" TOFIELD="A" '
+                 'FROMINSTANCETYPE="Source Definition" TOINSTANCETYPE="Target Definition"/>')
+    path = _write(tmp_path, 'unknown.xml', shared_definitions.format(connector=connector))
+    with pytest.raises(ValueError):
+        from_xml.from_xml(path)
+
+def test_index_matches_the_export(tmp_path):
+    path = str(tmp_path / 'export.xml')
+    shutil.copy(export, path)
+    index = from_xml.index_xml(path)
+    assert os.path.exists(path + '.pwcindex')
+    assert from_xml.index_xml(path) == index
+    summary = index['MDW_KRE'].mappings['m_test']
+    assert ('EXP_src', 'f1', 'mplt_0', 'f1') in summary.connectors
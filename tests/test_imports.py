@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import pwc, root
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+lazy = ['batch', 'metadata', 'asyncio', 'multiprocessing', 'sqlite3']
+
+
+def _run(code):
+    # A fresh interpreter, so no lazy module has been imported already
+    return subprocess.check_output([sys.executable, '-c', code], cwd=os.path.dirname(root),
+                                   universal_newlines=True).split()
+
+@pytest.mark.parametrize('module', ['', '.pypwc'])
+def test_star_import(module):
+    name = pwc.__name__ + module
+    missing = _run('import sys\nfrom {0} import *\n'
+                   'print(*[n for n in sys.modules[{0!r}].__all__ if n not in globals()])'.format(name))
+    assert missing == []
+
+def test_import_is_lazy():
+    loaded = _run('import sys, {}\nprint(*[m for m in sys.modules if m.split(".")[-1] in {!r}])'.format(
+        pwc.__name__ + '.pypwc', lazy))
+    assert loaded == []
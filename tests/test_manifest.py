@@ -0,0 +1,55 @@
+import io
+import os
+
+from conftest import manifest
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+Manifest = manifest.Manifest
+
+
+def test_unchanged_files_are_skipped(mapping, tmp_path, capsys):
+    path = str(tmp_path / 'm_test.xml')
+    assert mapping.write(path) is True
+    assert mapping.write(path) is False
+    assert 'Skipped' in capsys.readouterr().out
+
+    # Files edited by hand are written again
+    with open(path, 'a') as f:
+        f.write('\n')
+    assert mapping.write(path) is True
+
+    # As are changed composites
+    mapping.attributes['DESCRIPTION'] = 'Changed'
+    assert mapping.write(path) is True
+    assert mapping.write(path, force=True) is True
+
+def test_streams_are_written_without_a_manifest(mapping, tmp_path, capsys, monkeypatch):
+    stream = io.StringIO()
+    monkeypatch.chdir(str(tmp_path))
+    assert mapping.write(stream) is True
+    assert stream.getvalue().startswith('<?xml')
+    assert capsys.readouterr().out == ''
+    assert not os.path.exists(Manifest.filename)
+
+def test_batch_saves_once(mapping, tmp_path, capsys):
+    paths = [str(tmp_path / '{}.xml'.format(i)) for i in range(3)]
+    manifest_path = str(tmp_path / Manifest.filename)
+    with Manifest.batch():
+        for path in paths:
+            mapping.write(path)
+        assert not os.path.exists(manifest_path)
+    assert all(mapping.write(path) is False for path in paths)
+
+def test_saves_are_merged(mapping, tmp_path, capsys):
+    # Two writers, e.g. in two processes, that loaded the manifest before
+    # either of them saved
+    first, second = Manifest(str(tmp_path)), Manifest(str(tmp_path))
+    for manifest_, name in [(first, 'a.xml'), (second, 'b.xml')]:
+        path = str(tmp_path / name)
+        mapping.write(path, force=True)
+        manifest_.record(path, mapping.fingerprint(), 'utf-8')
+    first.save()
+    second.save()
+    assert sorted(Manifest(str(tmp_path)).entries) == ['a.xml', 'b.xml']
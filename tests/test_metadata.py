@@ -0,0 +1,62 @@
+import doctest
+
+import pytest
+
+from conftest import metadata
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+setup = 'CREATE TABLE T (ID BIGINT PRIMARY KEY, NAME NVARCHAR(50) NOT NULL)'
+
+
+class CountingBackend(metadata.SQLiteBackend):
+    '''An SQLiteBackend that counts its queries, and fails the first fail
+    of them.'''
+    def __init__(self, fail=0):
+        super().__init__(setup=setup)
+        self.fail = fail
+        self.queries = 0
+        self.closed = 0
+
+    def query(self, connection, sql):
+        self.queries += 1
+        if self.queries <= self.fail:
+            raise RuntimeError('The database is down')
+        return super().query(connection, sql)
+
+    def close(self, connection):
+        self.closed += 1
+        super().close(connection)
+
+
+def test_doctests():
+    assert doctest.testmod(metadata).failed == 0
+
+def test_query_is_cached():
+    backend = CountingBackend()
+    with metadata.MetadataProvider(backend) as provider:
+        first = provider.query('SELECT * FROM T')
+        assert provider.query('  SELECT * FROM T ') is first
+        assert list(first.column_names) == ['ID', 'NAME']
+    assert backend.queries == 1
+
+def test_failed_query_is_cleaned_up():
+    backend = CountingBackend(fail=1)
+    with metadata.MetadataProvider(backend) as provider:
+        with pytest.raises(RuntimeError):
+            provider.query('SELECT * FROM T')
+        assert provider._pending == {}
+        # The failed connection is closed, not returned to the pool
+        assert backend.closed == 1
+        assert provider.pool._idle.get('MDW', []) == []
+
+        assert list(provider.query('SELECT * FROM T').column_names) == ['ID', 'NAME']
+        assert provider._pending == {}
+
+def test_catalog():
+    with metadata.MetadataProvider(CountingBackend()) as provider:
+        catalog = provider.catalog(['T', 'MISSING'])
+    assert list(catalog) == ['T']
+    assert [(column.name, column.primary_key) for column in catalog['T']] == [
+        ('ID', True), ('NAME', False)]
@@ -0,0 +1,36 @@
+import doctest
+
+from conftest import names
+
+__author__ = 'Simon Bugge Siggaard'
+__email__ = 'sbs@bec.dk'
+
+
+def test_doctests():
+    assert doctest.testmod(names).failed == 0
+
+def test_unique():
+    registry = names.NameRegistry()
+    assert registry.unique('EXP_a') == 'EXP_a'
+    assert registry.unique('EXP_a') == 'EXP_a1'
+    registry.register('EXP_a2')
+    assert registry.unique('EXP_a') == 'EXP_a3'
+
+def test_maxsize_bounds_names_and_counters():
+    registry = names.NameRegistry(maxsize=10)
+    for i in range(1000):
+        registry.unique('prefix_{}'.format(i))
+        registry.unique('prefix_{}'.format(i))
+    assert len(registry) == 10
+    assert len(registry._counters) <= 10
+    # The names registered last are kept
+    assert 'prefix_9991' in registry
+    assert 'prefix_0' not in registry
+
+def test_name_scope():
+    outer = names.current_registry()
+    with names.name_scope() as registry:
+        assert names.current_registry() is registry
+        registry.register('scoped')
+    assert names.current_registry() is outer
+    assert 'scoped' not in outer
@@ -1,9 +1,9 @@
-import pytools
 from .pypwc.fields import *
 from .pypwc.Canvas import *
 from .pypwc.Transformations import *
-import DatabaseConnection as dbc
+from .pypwc.metadata import default_provider
 
+import asyncio
 import decimal
 import datetime
 from copy import deepcopy
@@ -95,96 +95,156 @@ def file_get_contents(filename):
     with open(filename) as f:
         return f.read()
 
-def field_names_from_sql(sql, env='MDW'):
+def field_names_from_sql(sql, env='MDW', provider=None):
     '''
     Assumes that the sql return 2 columns. The first column
     is assumed to contain the name of the field, and the 2nd column
     is assumed to contain an nstring expression.
+
+    The query is run by provider, a MetadataProvider, or by the
+    default provider, which caches the results.
     '''
-    # Connecting to the database
-    host = 'NZDEV.RES.BEC.DK'
-    database = 'DEV_{}'.format(env) # DEV because tables are always in DEV
-    with dbc.DatabaseConnection(host=host, database=database) as db:
-        db.sql = sql
-        data, column_names, _ = db.sql_results
+    if provider is None:
+        provider = default_provider()
+    return _field_names_from_result(provider.query(sql, env))
+
+def _field_names_from_result(result):
+    data, column_names, _ = result
     assert len(column_names) == 2
 
     field_names = [d[0] for d in data]
     expressions = [d[1] for d in data]
-    transformfields = [
-        ofield(info[0],
-                datatype='nstring',
-                expression="'{}'".format(info[1]),
-                precision='{}'.format(len(info[1])))
-        for info in zip(field_names, expressions)]
+    transformfields = fields_from_columns(
+        field_names, ['nstring']*len(field_names),
+        precisions=[len(expression) for expression in expressions],
+        expression=["'{}'".format(expression) for expression in expressions],
+        porttype='OUTPUT')
     return transformfields
 
-def target_from_sql(sql, env='MDW'):
+def target_from_sql(sql, env='MDW', provider=None):
+    # See field_names_from_sql()
+    if provider is None:
+        provider = default_provider()
+    return _target_from_result(sql, provider.query(sql, env))
 
+def _target_from_result(sql, result):
     # Janky way to find name from sql:
     trg_name = sql.split(' ')[3]
 
     trg = Target(name=trg_name)
 
-    # Connecting to the database
-    host = 'NZDEV.RES.BEC.DK'
-    database = 'DEV_{}'.format(env)
-    with dbc.DatabaseConnection(host=host, database=database) as db:
-        db.sql = sql
-        _, column_names, descriptions = db.sql_results
-        column_types = [d[1] for d in descriptions]
+    _, column_names, descriptions = result
 
     # Converting datatypes from the DatabaseConnection to
     # useful types in both PowerCenter and Netezza
-    nz_datatypes = map(get_nz_datatype_from_description, descriptions)
-    nz_col_name_and_type = zip(descriptions, column_names, nz_datatypes)
-
-
+    nz_datatypes = list(map(get_nz_datatype_from_description, descriptions))
 
     # Creating fields for the pwc.Target
-    target_fields = [
-        targetfield(name.upper(), datatype,
-                    precision=str(_col_precision(description)),
-                    scale=str(_scale(description)),
-                    fieldnumber=str(i+1),
-                    nullable='NULL' if _null_ok(description) else 'NOTNULL')
-        for i, (description, name, datatype) in enumerate(nz_col_name_and_type)
-        ]
-
     # Assume that (only) the first key in the table is the primary key
-    target_fields[0][1]['KEYTYPE'] = 'PRIMARY KEY'
+    target_fields = fields_from_columns(
+        [name.upper() for name in column_names], nz_datatypes,
+        precisions=map(_col_precision, descriptions),
+        scales=map(_scale, descriptions),
+        fieldnumber=range(1, len(descriptions)+1),
+        nullable=['NULL' if _null_ok(d) else 'NOTNULL' for d in descriptions],
+        keytype=['PRIMARY KEY'] + ['NOT A KEY']*(len(descriptions)-1),
+        fieldtype='TARGETFIELD')
     trg.add_fields(target_fields)
     trg.load_order = '0'
     return trg
 
+def targets_from_catalog(tables, env='MDW', provider=None):
+    '''
+    Returns a Target of each table in tables, in the same order, made from
+    the catalog of the database of env. The columns of all the tables are
+    found in a single query, see MetadataProvider.catalog(), and the
+    primary keys of the tables are used as such.
+
+    Raises a ValueError if any of the tables do not exist.
+    '''
+    if provider is None:
+        provider = default_provider()
+    tables = list(tables)
+    return _targets_from_catalog(tables, env, provider.catalog(tables, env))
+
+def _targets_from_catalog(tables, env, catalog):
+    missing = [table for table in tables if table not in catalog]
+    if missing:
+        raise ValueError('The tables {} were not found in {}'.format(missing, env))
+
+    targets = []
+    for table in tables:
+        columns = catalog[table]
+        trg = Target(name=table)
+        trg.add_fields(fields_from_columns(
+            [column.name.upper() for column in columns],
+            [column.datatype for column in columns],
+            precisions=[column.precision for column in columns],
+            scales=[column.scale for column in columns],
+            fieldnumber=[column.position for column in columns],
+            nullable=['NULL' if column.nullable else 'NOTNULL' for column in columns],
+            keytype=['PRIMARY KEY' if column.primary_key else 'NOT A KEY'
+                     for column in columns],
+            fieldtype='TARGETFIELD'))
+        trg.load_order = '0'
+        targets.append(trg)
+    return targets
+
+## Begin async section
+# The queries are run in the threads of the provider, at most
+# provider.concurrency at a time, while the event loop carries on, e.g.
+#
+# >>> async def main():
+# ...     targets = asyncio.create_task(targets_from_sql_async(sqls))
+# ...     mapping = build_mapping()      # While the queries run
+# ...     for target in await targets:
+# ...         ...
+async def field_names_from_sql_async(sql, env='MDW', provider=None):
+    '''As field_names_from_sql(), but awaitable.'''
+    if provider is None:
+        provider = default_provider()
+    return _field_names_from_result(await provider.query_async(sql, env))
+
+async def target_from_sql_async(sql, env='MDW', provider=None):
+    '''As target_from_sql(), but awaitable.'''
+    if provider is None:
+        provider = default_provider()
+    return _target_from_result(sql, await provider.query_async(sql, env))
+
+async def targets_from_sql_async(sqls, env='MDW', provider=None):
+    '''Returns the Targets of all of sqls, in the same order, made by
+    target_from_sql_async() concurrently.'''
+    return await asyncio.gather(*[target_from_sql_async(sql, env, provider)
+                                   for sql in sqls])
+
+async def targets_from_catalog_async(tables, env='MDW', provider=None):
+    '''As targets_from_catalog(), but awaitable.'''
+    if provider is None:
+        provider = default_provider()
+    tables = list(tables)
+    return _targets_from_catalog(tables, env, await provider.catalog_async(tables, env))
+## End async section
+
 def source_from_sql(composite, sql):
     raise NotImplementedError
 
 def _make_passthru_iofield_from_field(field):
     if field[0] == 'TARGETFIELD':
-        datatype = nz_pwc_type_dict[field[1]['DATATYPE']]
-    else:
-        datatype = field[1]['DATATYPE']
-        
-    description = field[1]['DESCRIPTION']
-    name = field[1]['NAME']
-    picture_text = field[1]['PICTURETEXT']
-    precision = field[1]['PRECISION']
-    scale = field[1]['SCALE']
-
-    io_field = iofield(name, datatype,
-                        description=description, precision=precision,
-                        picture_text=picture_text, scale=scale)
-
-    return io_field
+        return passthru_field(field, datatype=nz_pwc_type_dict[field[1]['DATATYPE']])
+    return passthru_field(field)
 
 def _adjust_field_type_to_io(field):
-    adj_field = deepcopy(field)
-    adj_field[1]['PORTTYPE'] = 'INPUT/OUTPUT'
-    adj_field[1]['GROUP'] = 'INPUT/OUTPUT'
-    if 'EXPRESSION' in adj_field[1]:
-        adj_field[1]['EXPRESSION'] = adj_field[1]['NAME']
-    return adj_field
+    if not isinstance(field, Field):
+        field = deepcopy(field)
+        field[1]['PORTTYPE'] = 'INPUT/OUTPUT'
+        field[1]['GROUP'] = 'INPUT/OUTPUT'
+        if 'EXPRESSION' in field[1]:
+            field[1]['EXPRESSION'] = field[1]['NAME']
+        return field
+    attributes = {'PORTTYPE': 'INPUT/OUTPUT', 'GROUP': 'INPUT/OUTPUT'}
+    if 'EXPRESSION' in field[1]:
+        attributes['EXPRESSION'] = field[1]['NAME']
+    return field.replace(**attributes)
 
 def passthru_from(component, component_type=Expression, name=None):
     if component.component_type == 'TARGET':